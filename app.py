@@ -1,6 +1,8 @@
 import streamlit as st
 from client_ollama import GmailMCPClient_Ollama
+from turn_trace import TurnTrace
 import asyncio
+import threading
 
 st.set_page_config(
     page_title="Gmail Assistant",
@@ -8,13 +10,97 @@ st.set_page_config(
     layout="wide"
 )
 
-# Inicializar cliente
+
+class BackgroundLoop:
+    """
+    Event loop propio en un hilo de fondo
+
+    Vive mientras el proceso de Streamlit, así la sesión MCP y las conexiones
+    con el LLM sobreviven a los reruns y las comparten todas las sesiones del
+    navegador.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="mcp-event-loop", daemon=True)
+        self.thread.start()
+
+    def run(self, coro):
+        """Ejecuta una corrutina en el loop de fondo y espera su resultado"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def iter(self, async_gen):
+        """Recorre un generador asíncrono del loop de fondo desde el código síncrono de Streamlit"""
+        async def next_item():
+            return await async_gen.__anext__()
+
+        try:
+            while True:
+                try:
+                    yield self.run(next_item())
+                except StopAsyncIteration:
+                    return
+        finally:
+            self.run(async_gen.aclose())
+
+
+# Inicializar loop de fondo y cliente (compartidos entre reruns y sesiones)
+@st.cache_resource
+def get_backend():
+    return BackgroundLoop()
+
 @st.cache_resource
 def get_client():
     return GmailMCPClient_Ollama()
 
+backend = get_backend()
 client = get_client()
 
+
+# Etiquetas del resumen de la traza de un turno
+TRACE_LABELS = {
+    "connect": "Conexión MCP",
+    "catalog": "Catálogo",
+    "llm": "LLM",
+    "tools": "Herramientas",
+    "other": "Otros",
+}
+
+def display_trace(trace: dict):
+    """Desglose de tiempos de un turno: conexión MCP, catálogo, LLM y herramientas"""
+    summary = trace["summary"]
+    st.caption(
+        f"Total: {summary['total'] / 1000:.2f} s · {trace['llm_calls']} llamadas al LLM · "
+        f"{trace['prompt_tokens']} tokens de prompt / {trace['completion_tokens']} generados"
+    )
+
+    cols = st.columns(2)
+    for i, (kind, label) in enumerate(TRACE_LABELS.items()):
+        cols[i % 2].metric(label, f"{summary[kind] / 1000:.2f} s")
+
+    rows = []
+    for span in trace["spans"]:
+        if span["kind"] == "llm":
+            detail = f"TTFT {span.get('ttft_ms', '-')} ms · {span.get('prompt_tokens', '?')} → {span.get('completion_tokens', '?')} tokens"
+            if span.get("load_ms"):
+                detail += f" · carga {span['load_ms']} ms"
+        elif span.get("error"):
+            detail = f"error: {span['error']}"
+        else:
+            detail = "caché" if span.get("cached") else ""
+        rows.append({
+            "tipo": span["kind"],
+            "nombre": span["name"],
+            "inicio ms": span["start_ms"],
+            "duración ms": span.get("duration_ms"),
+            "detalle": detail,
+        })
+    st.dataframe(rows, hide_index=True, use_container_width=True)
+
+    with st.expander("JSON", expanded=False):
+        st.json(trace)
+
+
 # Titulo
 st.title("📧 Gmail Assistant con MCP de JCDiaz")
 st.markdown("Asistente inteligente para gestionar tu Gmail usando Ollama")
@@ -43,7 +129,7 @@ with st.sidebar:
 
     st.markdown("### ℹ️ Información del sistema")
     with st.spinner("Cargando info..."):
-        info = asyncio.run(client.get_system_info())
+        info = backend.run(client.get_system_info())
 
     # Mostrar información en desplegables organizados
     with st.expander("🔧 Herramientas disponibles", expanded=False):
@@ -69,6 +155,15 @@ with st.sidebar:
         for prompt in info['prompts']:
             st.markdown(f"• `{prompt}`")
 
+    st.divider()
+
+    # Panel de depuración: dónde se fue el tiempo del último turno
+    if st.toggle("🐞 Traza del último turno", key="show_trace"):
+        if "last_trace" in st.session_state:
+            display_trace(st.session_state.last_trace)
+        else:
+            st.info("Aún no hay ningún turno")
+
 # Chat interface
 if "messages" not in st.session_state:
     st.session_state.messages = []
@@ -129,7 +224,7 @@ if "use_prompt" in st.session_state:
     params = st.session_state.pop("prompt_params", {})
     
     with st.spinner("Cargando prompt..."):
-        prompt_msg = asyncio.run(client.get_prompt_messages(prompt_name, **params))
+        prompt_msg = backend.run(client.get_prompt_messages(prompt_name, **params))
     
     # Mostrar el mensaje del usuario
     st.session_state.messages.append({"role": "user", "content": prompt_msg["content"]["text"]})
@@ -138,11 +233,10 @@ if "use_prompt" in st.session_state:
     
     # Obtener respuesta del assistant
     with st.chat_message("assistant"):
-        with st.spinner("Pensando..."):
-            response = asyncio.run(client.chat_completion(st.session_state.messages))
-        # Solo mostrar si hay contenido
-        if response and response.strip():
-            display_message(response, role="assistant")
+        # El texto se muestra a medida que el modelo lo genera
+        trace = TurnTrace(client.backend.model)
+        response = st.write_stream(backend.iter(client.chat_completion_stream(st.session_state.messages, trace)))
+    st.session_state.last_trace = trace.to_dict()
     
     # Guardar respuesta solo si no está vacía
     if response and response.strip():
@@ -158,11 +252,10 @@ if prompt := st.chat_input("Escribe tu mensaje..."):
         st.markdown(prompt)
     
     with st.chat_message("assistant"):
-        with st.spinner("Pensando..."):
-            response = asyncio.run(client.chat_completion(st.session_state.messages))
-        # Solo mostrar si hay contenido
-        if response and response.strip():
-            display_message(response, role="assistant")
+        # El texto se muestra a medida que el modelo lo genera
+        trace = TurnTrace(client.backend.model)
+        response = st.write_stream(backend.iter(client.chat_completion_stream(st.session_state.messages, trace)))
+    st.session_state.last_trace = trace.to_dict()
     
     # Guardar respuesta solo si no está vacía
     if response and response.strip():
@@ -0,0 +1,155 @@
+"""
+Benchmark del arranque en frío de gmail_mcp_server.py
+
+1. Perfil de imports (`python -X importtime`): tiempo total de importar el
+   servidor, los módulos más costosos y si se ha colado alguna librería de
+   Google que debería cargarse solo en el primer uso de Gmail.
+2. Tiempo hasta initialize: lanza el servidor por stdio con fastmcp.Client
+   (como los clientes reales) y mide el handshake y las primeras peticiones
+   que no tocan Gmail (list_tools, list_prompts, la TOC de un manual).
+
+Uso:
+    python benchmarks/bench_startup.py --runs 5 --json arranque.json
+"""
+
+from pathlib import Path
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from fastmcp import Client
+from fastmcp.client.transports import PythonStdioTransport
+
+ROOT = Path(__file__).resolve().parent.parent
+SERVER_SCRIPT = ROOT / "gmail_mcp_server.py"
+
+# Librerías que solo deben importarse en el primer uso de Gmail
+DEFERRED_MODULES = ("googleapiclient", "google_auth_oauthlib", "google_auth_httplib2", "google.auth", "httplib2")
+
+
+def server_env() -> dict:
+    """Entorno del servidor sin espejo local ni endpoint alternativo"""
+    return {key: value for key, value in os.environ.items()
+            if key not in ("GMAIL_MIRROR_PATH", "GMAIL_API_ENDPOINT")}
+
+
+# ==================== PERFIL DE IMPORTS ====================
+
+
+def parse_importtime(stderr: str) -> list[dict]:
+    """Líneas de -X importtime como {module, self_us, cumulative_us, depth}"""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.append({
+            "module": name.strip(),
+            "self_us": int(self_us),
+            "cumulative_us": int(cumulative_us),
+            "depth": (len(name) - len(name.lstrip())) // 2,
+        })
+    return modules
+
+
+def profile_imports() -> dict:
+    """Importa el servidor en un proceso nuevo con -X importtime"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import gmail_mcp_server"],
+        cwd=ROOT, env=server_env(), capture_output=True, text=True, check=True
+    )
+    modules = parse_importtime(result.stderr)
+    index = next(i for i, m in enumerate(modules) if m["module"] == "gmail_mcp_server")
+    server = modules[index]
+
+    # Hijos directos del servidor (importtime los escribe justo antes que su padre)
+    children = []
+    for module in reversed(modules[:index]):
+        if module["depth"] == 0:
+            break
+        if module["depth"] == 1:
+            children.append(module)
+    deferred = sorted({m["module"] for m in modules if m["module"].startswith(DEFERRED_MODULES)})
+    return {
+        "total_ms": server["cumulative_us"] / 1000,
+        "top": sorted(children, key=lambda m: m["cumulative_us"], reverse=True)[:10],
+        "deferred_imported": deferred,
+    }
+
+
+# ==================== TIEMPO HASTA INITIALIZE ====================
+
+
+async def measure_session() -> dict:
+    """Lanza el servidor por stdio y mide el handshake y las primeras peticiones"""
+    timings = {}
+    start = time.perf_counter()
+    client = Client(PythonStdioTransport(str(SERVER_SCRIPT), env=server_env(), cwd=str(ROOT)))
+    async with client:
+        timings["initialize_ms"] = (time.perf_counter() - start) * 1000
+
+        step = time.perf_counter()
+        await client.list_tools()
+        timings["list_tools_ms"] = (time.perf_counter() - step) * 1000
+
+        step = time.perf_counter()
+        await client.list_prompts()
+        timings["list_prompts_ms"] = (time.perf_counter() - step) * 1000
+
+        step = time.perf_counter()
+        await client.read_resource("docs://setup-manual/latest/toc")
+        timings["manual_toc_ms"] = (time.perf_counter() - step) * 1000
+    return timings
+
+
+def interpreter_baseline() -> float:
+    """Milisegundos de arrancar un intérprete vacío (suelo del arranque del servidor)"""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"], check=True)
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Arranque en frío del servidor MCP de Gmail")
+    parser.add_argument("--runs", type=int, default=5, help="Arranques medidos (se informa la mediana)")
+    parser.add_argument("--json", help="Fichero donde guardar los resultados")
+    args = parser.parse_args()
+
+    profiles = [profile_imports() for _ in range(args.runs)]
+    sessions = [asyncio.run(measure_session()) for _ in range(args.runs)]
+    baseline = statistics.median(interpreter_baseline() for _ in range(args.runs))
+
+    report = {
+        "runs": args.runs,
+        "interpreter_ms": baseline,
+        "import_ms": statistics.median(p["total_ms"] for p in profiles),
+        "top_imports": profiles[-1]["top"],
+        "deferred_imported": profiles[-1]["deferred_imported"],
+        "session": {key: statistics.median(s[key] for s in sessions) for key in sessions[0]},
+    }
+
+    print(f"\nArranque de gmail_mcp_server.py (mediana de {args.runs})\n")
+    print(f"Intérprete vacío:       {report['interpreter_ms']:8.1f} ms")
+    print(f"import gmail_mcp_server:{report['import_ms']:8.1f} ms")
+    for key, value in report["session"].items():
+        print(f"{key:<24}{value:8.1f} ms")
+
+    print("\nImports más costosos del servidor:")
+    for module in report["top_imports"]:
+        print(f"  {module['module']:<32}{module['cumulative_us'] / 1000:8.1f} ms")
+
+    if report["deferred_imported"]:
+        print(f"\nAVISO: librerías de Google importadas al arrancar: {', '.join(report['deferred_imported'])}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Benchmark de extremo a extremo de las herramientas del servidor MCP
+
+Arranca la API de Gmail falsa (fake_gmail.py), lanza gmail_mcp_server.py
+contra ella y lo ejercita con fastmcp.Client. Informa de p50/p95 de latencia
+y del throughput de cada herramienta.
+
+Uso:
+    python benchmarks/bench_tools.py --messages 100000 --requests 200 --concurrency 8
+    python benchmarks/bench_tools.py --latency-ms 30 --error-rate 0.02 --json resultados.json
+"""
+
+from pathlib import Path
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+from fastmcp import Client
+from fastmcp.client.transports import PythonStdioTransport
+
+from fake_gmail import start_fake_gmail
+
+SERVER_SCRIPT = Path(__file__).resolve().parent.parent / "gmail_mcp_server.py"
+QUERIES = ["", "is:unread", "from:github", "subject:factura", "is:starred -is:unread"]
+
+# ==================== ESCENARIOS ====================
+
+
+def scenarios(mailbox_size: int, rng: random.Random) -> dict:
+    """Nombre -> (tipo, función que genera los argumentos de cada llamada)"""
+    return {
+        "list_emails": ("tool", lambda: {"max_results": 10, "query": rng.choice(QUERIES)}),
+        "list_emails_page": ("tool", lambda: {"page_size": 50, "query": rng.choice(QUERIES)}),
+        "get_email": ("tool", lambda: {"email_id": f"{rng.randrange(mailbox_size):016x}"}),
+        "send_email": ("tool", lambda: {
+            "to": "destino@example.com",
+            "subject": "Benchmark",
+            "body": "Mensaje generado por bench_tools.py"
+        }),
+        "gmail://profile": ("resource", lambda: None),
+        "gmail://inbox-summary": ("resource", lambda: None),
+    }
+
+
+async def run_scenario(client: Client, kind: str, name: str, make_args, requests: int, concurrency: int) -> dict:
+    """Lanza `requests` llamadas con `concurrency` en vuelo y mide cada una"""
+    latencies = []
+    errors = 0
+    pending = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in pending:
+            start = time.perf_counter()
+            try:
+                if kind == "tool":
+                    result = await client.call_tool(name, make_args(), raise_on_error=False)
+                    failed = result.is_error
+                else:
+                    await client.read_resource(name)
+                    failed = False
+            except Exception:
+                failed = True
+            latencies.append(time.perf_counter() - start)
+            errors += failed
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "requests": requests,
+        "errors": errors,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "max_ms": max(latencies) * 1000,
+        "throughput_rps": requests / elapsed,
+    }
+
+
+def percentile(values: list[float], p: float) -> float:
+    """Percentil con interpolación lineal (statistics.quantiles no admite una sola muestra)"""
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(p) - 1]
+
+
+# ==================== EJECUCIÓN ====================
+
+
+def create_client(endpoint: str, transport: str) -> Client:
+    """Cliente MCP contra el servidor por stdio (como en producción) o en memoria"""
+    env = {key: value for key, value in os.environ.items() if key != "GMAIL_MIRROR_PATH"}
+    env["GMAIL_API_ENDPOINT"] = endpoint
+
+    if transport == "stdio":
+        return Client(PythonStdioTransport(str(SERVER_SCRIPT), env=env, cwd=str(SERVER_SCRIPT.parent)))
+
+    # En memoria: el servidor comparte proceso (y GIL) con el benchmark y la API falsa
+    os.environ.clear()
+    os.environ.update(env)
+    sys.path.insert(0, str(SERVER_SCRIPT.parent))
+    from gmail_mcp_server import mcp
+    return Client(mcp)
+
+
+async def run_benchmark(args) -> dict:
+    fake = start_fake_gmail(
+        messages=args.messages,
+        seed=args.seed,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate
+    )
+    rng = random.Random(args.seed)
+    selected = scenarios(args.messages, rng)
+    if args.tools:
+        selected = {name: selected[name] for name in args.tools}
+
+    results = {}
+    try:
+        start = time.perf_counter()
+        async with create_client(fake.endpoint, args.transport) as client:
+            connect_ms = (time.perf_counter() - start) * 1000
+
+            for name, (kind, make_args) in selected.items():
+                # Calentamiento: discovery, conexiones keep-alive, recuentos de etiquetas
+                await run_scenario(client, kind, name, make_args, args.warmup, 1)
+                results[name] = await run_scenario(client, kind, name, make_args, args.requests, args.concurrency)
+    finally:
+        fake.shutdown()
+
+    return {
+        "config": {
+            "messages": args.messages,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "latency_ms": args.latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "error_rate": args.error_rate,
+            "transport": args.transport,
+        },
+        "connect_ms": connect_ms,
+        "fake_gmail": dict(fake.stats),
+        "results": results,
+    }
+
+
+def print_report(report: dict):
+    config = report["config"]
+    print(f"\nBuzón: {config['messages']} mensajes | {config['requests']} peticiones x "
+          f"{config['concurrency']} concurrentes | latencia {config['latency_ms']} ms | "
+          f"errores 429 {config['error_rate']:.1%} | {config['transport']}")
+    print(f"Conexión al servidor: {report['connect_ms']:.0f} ms\n")
+
+    print(f"{'herramienta':<24}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'req/s':>10}{'errores':>10}")
+    for name, result in report["results"].items():
+        print(f"{name:<24}{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}{result['max_ms']:>10.1f}"
+              f"{result['throughput_rps']:>10.1f}{result['errors']:>10}")
+
+    stats = report["fake_gmail"]
+    print(f"\nAPI falsa: {stats['requests']} peticiones HTTP, {stats['batch_parts']} partes de batch, "
+          f"{stats['errors_429']} respuestas 429")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de las herramientas del servidor MCP de Gmail")
+    parser.add_argument("--messages", type=int, default=10_000, help="Tamaño del buzón sintético")
+    parser.add_argument("--requests", type=int, default=100, help="Llamadas medidas por herramienta")
+    parser.add_argument("--concurrency", type=int, default=4, help="Llamadas en vuelo a la vez")
+    parser.add_argument("--warmup", type=int, default=3, help="Llamadas de calentamiento por herramienta")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Latencia de la API falsa")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Latencia aleatoria adicional")
+    parser.add_argument("--error-rate", type=float, default=0, help="Probabilidad de 429 en la API falsa")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--transport", choices=["stdio", "memory"], default="stdio")
+    parser.add_argument("--tools", nargs="+", help="Subconjunto de herramientas/recursos a medir")
+    parser.add_argument("--json", help="Fichero donde guardar los resultados")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_benchmark(args))
+    print_report(report)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,538 @@
+"""
+Servidor local que imita los endpoints de la API de Gmail v1
+
+Sirve un buzón sintético y determinista de tamaño configurable (los mensajes
+se generan a partir de su índice, no se guardan) con latencia y errores 429
+inyectables. El servidor MCP lo usa en lugar de la API real con:
+
+    GMAIL_API_ENDPOINT=http://127.0.0.1:8089/ python gmail_mcp_server.py
+
+Endpoints: getProfile, messages.list/get/send, messages.attachments.get,
+threads.get, labels.list/get, history.list y el endpoint /batch.
+
+Uso:
+    python benchmarks/fake_gmail.py --messages 100000 --latency-ms 20 --error-rate 0.01
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import argparse
+import base64
+import email
+import json
+import random
+import re
+import threading
+import time
+
+BASE_DATE_MS = 1_700_000_000_000
+MESSAGE_INTERVAL_MS = 10 * 60 * 1000
+BASE_HISTORY_ID = 100_000
+EMAIL_ADDRESS = "benchmark@example.com"
+THREAD_SIZE = 3
+
+SENDERS = [
+    "Ana García <ana@example.com>",
+    "GitHub <noreply@github.com>",
+    "Banco <avisos@banco.example>",
+    "Luis Pérez <luis@example.org>",
+    "Newsletter <news@example.net>",
+    "Soporte <support@example.com>",
+]
+SUBJECTS = [
+    "Reunión de seguimiento",
+    "Factura del mes",
+    "Pull request revisada",
+    "Tu pedido ha sido enviado",
+    "Resumen semanal",
+    "Alerta de seguridad",
+]
+CATEGORIES = ["CATEGORY_PERSONAL", "CATEGORY_UPDATES", "CATEGORY_PROMOTIONS", "CATEGORY_SOCIAL"]
+SYSTEM_LABELS = ["INBOX", "SENT", "UNREAD", "IMPORTANT", "STARRED", "SPAM", "TRASH", "DRAFT"] + CATEGORIES
+
+IS_LABELS = {"unread": "UNREAD", "starred": "STARRED", "important": "IMPORTANT"}
+HEADER_OPERATORS = {"from": "From", "to": "To", "subject": "Subject"}
+
+
+class SyntheticMailbox:
+    """Buzón determinista: los metadatos del mensaje i se derivan de (i, seed)"""
+
+    def __init__(self, size: int, seed: int = 0, body_bytes: int = 2000):
+        self.size = size
+        self.seed = seed
+        self.body_bytes = body_bytes
+        self.sent = []
+        self._label_counts = None
+        self._lock = threading.Lock()
+
+    # ==================== MENSAJES ====================
+
+    def _hash(self, index: int) -> int:
+        return ((index + self.seed * 0x9E3779B1) * 2654435761) & 0xFFFFFFFF
+
+    def message_ids(self):
+        """IDs en orden cronológico inverso (primero los enviados durante la prueba)"""
+        for message in reversed(self.sent):
+            yield message["id"]
+        for index in range(self.size):
+            yield f"{index:016x}"
+
+    def _index(self, message_id: str) -> int | None:
+        try:
+            index = int(message_id, 16)
+        except ValueError:
+            return None
+        return index if 0 <= index < self.size else None
+
+    def labels(self, index: int) -> list[str]:
+        h = self._hash(index)
+        if h % 10 == 9:
+            return ["SENT"]
+        labels = ["INBOX", CATEGORIES[(h >> 4) % len(CATEGORIES)]]
+        if h % 4 == 0:
+            labels.append("UNREAD")
+        if h % 7 == 0:
+            labels.append("IMPORTANT")
+        if h % 13 == 0:
+            labels.append("STARRED")
+        return labels
+
+    def _headers(self, index: int) -> list[dict]:
+        h = self._hash(index)
+        sender = SENDERS[(h >> 8) % len(SENDERS)]
+        if h % 10 == 9:
+            sender, recipient = EMAIL_ADDRESS, sender
+        else:
+            recipient = EMAIL_ADDRESS
+        date = time.strftime("%a, %d %b %Y %H:%M:%S +0000",
+                             time.gmtime((BASE_DATE_MS - index * MESSAGE_INTERVAL_MS) / 1000))
+        return [
+            {"name": "From", "value": sender},
+            {"name": "To", "value": recipient},
+            {"name": "Subject", "value": f"{SUBJECTS[(h >> 12) % len(SUBJECTS)]} #{index}"},
+            {"name": "Date", "value": date},
+        ]
+
+    def get(self, message_id: str) -> dict | None:
+        """Mensaje en formato 'full' o None si no existe"""
+        for message in self.sent:
+            if message["id"] == message_id:
+                return message
+
+        index = self._index(message_id)
+        if index is None:
+            return None
+
+        text = f"Mensaje sintético {index}. " * (self.body_bytes // 24 + 1)
+        text = text[:self.body_bytes]
+        html_text = f"<html><body><p>{text}</p></body></html>"
+        headers = self._headers(index)
+        return {
+            "id": message_id,
+            "threadId": f"{index - index % THREAD_SIZE:016x}",
+            "labelIds": self.labels(index),
+            "snippet": text[:100],
+            "historyId": str(BASE_HISTORY_ID),
+            "internalDate": str(BASE_DATE_MS - index * MESSAGE_INTERVAL_MS),
+            "sizeEstimate": len(text) + len(html_text) + 500,
+            "payload": {
+                "partId": "",
+                "mimeType": "multipart/alternative",
+                "filename": "",
+                "headers": headers + [{"name": "Content-Type", "value": "multipart/alternative; boundary=b"}],
+                "body": {"size": 0},
+                "parts": [
+                    _text_part("0", "text/plain", text),
+                    _text_part("1", "text/html", html_text),
+                ],
+            },
+        }
+
+    def matches(self, message_id: str, terms: list) -> bool:
+        """Evalúa una búsqueda sencilla (AND de operadores is:, in:, label:, from:, to:, subject:)"""
+        if not terms:
+            return True
+        index = self._index(message_id)
+        if index is None:
+            message = self.get(message_id)
+            labels, headers = message["labelIds"], message["payload"]["headers"]
+        else:
+            labels, headers = self.labels(index), None
+
+        for negated, op, value in terms:
+            if op in ("is", "in", "label"):
+                label = IS_LABELS.get(value, value.upper()) if op == "is" else value.upper()
+                result = label in labels
+            else:
+                if headers is None:
+                    headers = self._headers(index)
+                header = next((h["value"] for h in headers if h["name"] == HEADER_OPERATORS[op]), "")
+                result = value.lower() in header.lower()
+            if result == negated:
+                return False
+        return True
+
+    def send(self, raw: str) -> dict:
+        """Guarda un mensaje enviado (raw en base64url) y devuelve su recurso"""
+        mime = email.message_from_bytes(base64.urlsafe_b64decode(raw + "=" * (-len(raw) % 4)))
+        body = mime.get_payload(decode=True) or b""
+        with self._lock:
+            number = len(self.sent) + 1
+            message_id = f"s{number:015x}"
+            message = {
+                "id": message_id,
+                "threadId": message_id,
+                "labelIds": ["SENT"],
+                "snippet": body[:100].decode("utf-8", "ignore"),
+                "historyId": str(BASE_HISTORY_ID + number),
+                "internalDate": str(int(time.time() * 1000)),
+                "sizeEstimate": len(raw),
+                "payload": {
+                    "partId": "",
+                    "mimeType": mime.get_content_type(),
+                    "filename": "",
+                    "headers": [
+                        {"name": "From", "value": EMAIL_ADDRESS},
+                        {"name": "To", "value": mime.get("to", "")},
+                        {"name": "Subject", "value": mime.get("subject", "")},
+                    ],
+                    "body": {"size": len(body), "data": base64.urlsafe_b64encode(body).decode()},
+                },
+            }
+            self.sent.append(message)
+        return {"id": message_id, "threadId": message_id, "labelIds": ["SENT"]}
+
+    # ==================== CONTADORES ====================
+
+    def history_id(self) -> str:
+        return str(BASE_HISTORY_ID + len(self.sent))
+
+    def label_counts(self) -> dict:
+        """{etiqueta: [mensajes, no leídos]} del buzón sintético (se calcula una vez)"""
+        with self._lock:
+            if self._label_counts is None:
+                counts = {label: [0, 0] for label in SYSTEM_LABELS}
+                for index in range(self.size):
+                    labels = self.labels(index)
+                    unread = "UNREAD" in labels
+                    for label in labels:
+                        counts[label][0] += 1
+                        counts[label][1] += unread
+                self._label_counts = counts
+            return self._label_counts
+
+    def label(self, label_id: str) -> dict | None:
+        counts = self.label_counts().get(label_id)
+        if counts is None:
+            return None
+        total, unread = counts
+        if label_id == "SENT":
+            total += len(self.sent)
+        return {
+            "id": label_id,
+            "name": label_id,
+            "type": "system",
+            "messagesTotal": total,
+            "messagesUnread": unread,
+            "threadsTotal": (total + THREAD_SIZE - 1) // THREAD_SIZE,
+            "threadsUnread": (unread + THREAD_SIZE - 1) // THREAD_SIZE,
+        }
+
+
+def _text_part(part_id: str, mime_type: str, text: str) -> dict:
+    data = text.encode("utf-8")
+    return {
+        "partId": part_id,
+        "mimeType": mime_type,
+        "filename": "",
+        "headers": [{"name": "Content-Type", "value": f'{mime_type}; charset="UTF-8"'}],
+        "body": {"size": len(data), "data": base64.urlsafe_b64encode(data).decode()},
+    }
+
+
+def parse_query(query: str) -> list:
+    """Términos (negado, operador, valor) de la búsqueda; lo que no se reconoce se ignora"""
+    terms = []
+    for token in query.split():
+        negated = token.startswith("-")
+        match = re.fullmatch(r"(is|in|label|from|to|subject):(.+)", token.lstrip("-"), re.IGNORECASE)
+        if match:
+            terms.append((negated, match.group(1).lower(), match.group(2).strip('"').lower()))
+    return terms
+
+
+def _error(status: int, message: str, reason: str) -> tuple[int, dict]:
+    return status, {"error": {"code": status, "message": message, "errors": [{"reason": reason, "message": message}]}}
+
+
+# ==================== SERVIDOR HTTP ====================
+
+class FakeGmailServer(ThreadingHTTPServer):
+    """Servidor HTTP con el buzón, la latencia y los errores configurados"""
+
+    daemon_threads = True
+
+    def __init__(self, address, mailbox: SyntheticMailbox, latency_ms: float = 0, jitter_ms: float = 0,
+                 error_rate: float = 0, seed: int = 0):
+        super().__init__(address, FakeGmailHandler)
+        self.mailbox = mailbox
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.stats = {"requests": 0, "batch_parts": 0, "errors_429": 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def count(self, key: str, amount: int = 1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def delay(self):
+        """Latencia simulada de la red y del backend"""
+        if self.latency_ms or self.jitter_ms:
+            with self._lock:
+                jitter = self._random.uniform(0, self.jitter_ms)
+            time.sleep((self.latency_ms + jitter) / 1000)
+
+    def throttled(self) -> bool:
+        """True si esta petición debe responder 429"""
+        if not self.error_rate:
+            return False
+        with self._lock:
+            hit = self._random.random() < self.error_rate
+            if hit:
+                self.stats["errors_429"] += 1
+        return hit
+
+    # ==================== RUTAS ====================
+
+    def dispatch(self, method: str, target: str, body: bytes) -> tuple[int, dict]:
+        """Resuelve una petición de la API y devuelve (estado, JSON)"""
+        if self.throttled():
+            return _error(429, "Too many requests", "rateLimitExceeded")
+
+        url = urlsplit(target)
+        params = parse_qs(url.query)
+        match = re.fullmatch(r"/gmail/v1/users/[^/]+/(.+)", url.path)
+        if not match:
+            return _error(404, "Not Found", "notFound")
+        path = match.group(1)
+        mailbox = self.mailbox
+
+        if method == "GET" and path == "profile":
+            return 200, {
+                "emailAddress": EMAIL_ADDRESS,
+                "messagesTotal": mailbox.size + len(mailbox.sent),
+                "threadsTotal": (mailbox.size + THREAD_SIZE - 1) // THREAD_SIZE + len(mailbox.sent),
+                "historyId": mailbox.history_id(),
+            }
+
+        if method == "GET" and path == "messages":
+            return 200, self.list_messages(params)
+
+        if method == "POST" and path == "messages/send":
+            raw = json.loads(body or b"{}").get("raw")
+            if not raw:
+                return _error(400, "Invalid raw message", "invalidArgument")
+            return 200, mailbox.send(raw)
+
+        match = re.fullmatch(r"messages/([^/]+)", path)
+        if method == "GET" and match:
+            message = mailbox.get(match.group(1))
+            if message is None:
+                return _error(404, "Requested entity was not found.", "notFound")
+            return 200, format_message(message, params)
+
+        if method == "GET" and re.fullmatch(r"messages/[^/]+/attachments/[^/]+", path):
+            return _error(404, "Requested entity was not found.", "notFound")
+
+        match = re.fullmatch(r"threads/([^/]+)", path)
+        if method == "GET" and match:
+            index = mailbox._index(match.group(1))
+            if index is None or index % THREAD_SIZE:
+                return _error(404, "Requested entity was not found.", "notFound")
+            ids = [f"{i:016x}" for i in range(index, min(index + THREAD_SIZE, mailbox.size))]
+            return 200, {"id": match.group(1), "messages": [mailbox.get(i) for i in ids]}
+
+        if method == "GET" and path == "labels":
+            return 200, {"labels": [{"id": label, "name": label, "type": "system"} for label in SYSTEM_LABELS]}
+
+        match = re.fullmatch(r"labels/([^/]+)", path)
+        if method == "GET" and match:
+            label = mailbox.label(match.group(1))
+            if label is None:
+                return _error(404, "Requested entity was not found.", "notFound")
+            return 200, label
+
+        if method == "GET" and path == "history":
+            start = int(params.get("startHistoryId", ["0"])[0])
+            history = [
+                {"id": message["historyId"], "messagesAdded": [{"message": {
+                    "id": message["id"], "threadId": message["threadId"], "labelIds": message["labelIds"]}}]}
+                for message in mailbox.sent
+                if int(message["historyId"]) > start
+            ]
+            return 200, {"history": history, "historyId": mailbox.history_id()}
+
+        return _error(404, "Not Found", "notFound")
+
+    def list_messages(self, params: dict) -> dict:
+        """messages.list: pageToken es el desplazamiento en el orden del buzón"""
+        max_results = min(int(params.get("maxResults", ["100"])[0]), 500)
+        offset = int(params.get("pageToken", ["0"])[0] or 0)
+        terms = parse_query(params.get("q", [""])[0])
+
+        messages = []
+        position = 0
+        next_token = None
+        for position, message_id in enumerate(self.mailbox.message_ids()):
+            if position < offset or not self.mailbox.matches(message_id, terms):
+                continue
+            if len(messages) == max_results:
+                next_token = str(position)
+                break
+            index = self.mailbox._index(message_id)
+            thread_id = f"{index - index % THREAD_SIZE:016x}" if index is not None else message_id
+            messages.append({"id": message_id, "threadId": thread_id})
+
+        result = {"resultSizeEstimate": len(messages)}
+        if messages:
+            result["messages"] = messages
+        if next_token:
+            result["nextPageToken"] = next_token
+        return result
+
+
+def format_message(message: dict, params: dict) -> dict:
+    """Aplica format (full, metadata, minimal) y metadataHeaders a un mensaje"""
+    message_format = params.get("format", ["full"])[0]
+    if message_format == "full":
+        return message
+
+    result = {key: value for key, value in message.items() if key != "payload"}
+    if message_format == "metadata":
+        wanted = {name.lower() for name in params.get("metadataHeaders", [])}
+        headers = message["payload"]["headers"]
+        result["payload"] = {
+            "mimeType": message["payload"]["mimeType"],
+            "headers": [h for h in headers if not wanted or h["name"].lower() in wanted],
+        }
+    return result
+
+
+class FakeGmailHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 para que httplib2 reutilice la conexión (keep-alive)
+    protocol_version = "HTTP/1.1"
+    # Cabeceras y cuerpo se escriben por separado: sin esto Nagle + delayed ACK añaden ~40 ms
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send(self, status: int, content_type: str, payload: bytes):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _handle(self, method: str):
+        server = self.server
+        server.count("requests")
+        body = self._body()
+        server.delay()
+
+        if method == "POST" and urlsplit(self.path).path.rstrip("/") == "/batch":
+            self._handle_batch(body)
+            return
+
+        status, payload = server.dispatch(method, self.path, body)
+        self._send(status, "application/json; charset=UTF-8", json.dumps(payload).encode())
+
+    def _handle_batch(self, body: bytes):
+        """Endpoint /batch: cada parte multipart/mixed es una petición HTTP completa"""
+        server = self.server
+        content_type = self.headers.get("Content-Type", "")
+        match = re.search(r'boundary="?([^";]+)"?', content_type)
+        if not match:
+            self._send(400, "application/json", json.dumps(_error(400, "Missing boundary", "badRequest")[1]).encode())
+            return
+
+        request = email.message_from_bytes(f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+        parts = []
+        for part in request.get_payload():
+            inner = part.get_payload()
+            head, _, inner_body = inner.replace("\r\n", "\n").partition("\n\n")
+            method, target, _ = head.split("\n", 1)[0].split(" ", 2)
+            status, payload = server.dispatch(method, target, inner_body.encode())
+            content_id = part.get("Content-ID", "<item+0>")
+            parts.append(
+                "Content-Type: application/http\r\n"
+                f"Content-ID: <response-{content_id.strip('<>')}>\r\n\r\n"
+                f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                "Content-Type: application/json; charset=UTF-8\r\n\r\n"
+                f"{json.dumps(payload)}\r\n"
+            )
+        server.count("batch_parts", len(parts))
+
+        boundary = "batch_fake_gmail"
+        response = "".join(f"--{boundary}\r\n{part}" for part in parts) + f"--{boundary}--\r\n"
+        self._send(200, f"multipart/mixed; boundary={boundary}", response.encode())
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+
+def start_fake_gmail(messages: int = 10_000, host: str = "127.0.0.1", port: int = 0, seed: int = 0,
+                     latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0,
+                     body_bytes: int = 2000) -> FakeGmailServer:
+    """Arranca el servidor en un hilo de fondo (port=0 elige un puerto libre)"""
+    server = FakeGmailServer(
+        (host, port),
+        SyntheticMailbox(messages, seed=seed, body_bytes=body_bytes),
+        latency_ms=latency_ms,
+        jitter_ms=jitter_ms,
+        error_rate=error_rate,
+        seed=seed
+    )
+    thread = threading.Thread(target=server.serve_forever, name="fake-gmail", daemon=True)
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API de Gmail falsa para benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--messages", type=int, default=10_000, help="Tamaño del buzón sintético")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency-ms", type=float, default=0, help="Latencia fija por petición")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Latencia aleatoria adicional (0..jitter)")
+    parser.add_argument("--error-rate", type=float, default=0, help="Probabilidad de responder 429")
+    parser.add_argument("--body-bytes", type=int, default=2000, help="Tamaño del cuerpo de cada mensaje")
+    args = parser.parse_args()
+
+    server = start_fake_gmail(args.messages, args.host, args.port, args.seed, args.latency_ms,
+                              args.jitter_ms, args.error_rate, args.body_bytes)
+    print(f"API de Gmail falsa en {server.endpoint} ({args.messages} mensajes)")
+    print(f"GMAIL_API_ENDPOINT={server.endpoint}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
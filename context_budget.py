@@ -0,0 +1,118 @@
+"""
+Presupuesto de tokens del contexto que se envía al LLM
+
+Estima los tokens de cada mensaje y, antes de cada llamada al modelo,
+recorta los resultados de herramientas (más los antiguos que los del turno
+actual) y descarta los turnos más viejos hasta que el prompt cabe en el
+límite del modelo. El historial original no se modifica.
+"""
+
+import json
+import os
+
+# Tokens de contexto por modelo. gpt-4o-mini admite 128k, pero se limita para acotar coste y
+# latencia; para Ollama es el num_ctx con el que se sirve el modelo
+MODEL_CONTEXT_TOKENS = {
+    "gpt-4o-mini": 32000,
+    "qwen3:8b": 8192,
+}
+DEFAULT_CONTEXT_TOKENS = 8192
+
+# Tokens reservados para la respuesta del modelo
+RESPONSE_RESERVE = int(os.getenv("LLM_RESPONSE_RESERVE", "1024"))
+
+# Tokens máximos de un resultado de herramienta del turno actual y de turnos anteriores
+TOOL_RESULT_TOKENS = int(os.getenv("LLM_TOOL_RESULT_TOKENS", "2000"))
+OLD_TOOL_RESULT_TOKENS = int(os.getenv("LLM_OLD_TOOL_RESULT_TOKENS", "200"))
+MIN_TOOL_RESULT_TOKENS = 100
+
+# Estimación sin tokenizador: ~4 caracteres por token y un coste fijo por mensaje
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD = 4
+
+
+def context_tokens(model: str) -> int:
+    """Tokens de contexto del modelo (LLM_CONTEXT_TOKENS tiene prioridad)"""
+    override = os.getenv("LLM_CONTEXT_TOKENS")
+    if override:
+        return int(override)
+    return MODEL_CONTEXT_TOKENS.get(model, DEFAULT_CONTEXT_TOKENS)
+
+
+def estimate_tokens(value) -> int:
+    """Tokens aproximados de un texto o de una estructura serializable"""
+    if value is None:
+        return 0
+    if not isinstance(value, str):
+        value = json.dumps(value, ensure_ascii=False, default=str)
+    return (len(value) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def message_tokens(message: dict) -> int:
+    """Tokens aproximados de un mensaje del chat"""
+    return MESSAGE_OVERHEAD + estimate_tokens(message.get("content")) + estimate_tokens(message.get("tool_calls"))
+
+
+def truncate_text(text: str, max_tokens: int) -> str:
+    """Recorta un texto a max_tokens conservando el principio"""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}\n[... recortado: {len(text) - max_chars} caracteres omitidos]"
+
+
+def _truncate_tool_results(messages: list, start: int, end: int, max_tokens: int):
+    for i in range(start, end):
+        message = messages[i]
+        if message.get("role") == "tool" and isinstance(message.get("content"), str):
+            content = truncate_text(message["content"], max_tokens)
+            if content is not message["content"]:
+                messages[i] = {**message, "content": content}
+
+
+def fit_messages(messages: list, model: str, tools: list | None = None) -> list:
+    """
+    Mensajes a enviar al modelo dentro de su presupuesto de tokens
+
+    Se conservan siempre los mensajes de sistema y el turno actual (desde el
+    último mensaje del usuario). Se aplica, por orden, hasta que el prompt cabe:
+    1. Recortar resultados de herramientas: TOOL_RESULT_TOKENS en el turno
+       actual y OLD_TOOL_RESULT_TOKENS en los anteriores
+    2. Descartar los turnos más antiguos completos (así cada tool call sigue
+       junto a su resultado)
+    3. Reducir a la mitad los resultados del turno actual
+
+    Args:
+        messages: Historial de la conversación (no se modifica)
+        model: Nombre del modelo
+        tools: Esquemas de herramientas que se envían junto al prompt
+
+    Returns:
+        Nueva lista de mensajes
+    """
+    budget = context_tokens(model) - RESPONSE_RESERVE - estimate_tokens(tools)
+    messages = list(messages)
+
+    current = next((i for i in range(len(messages) - 1, -1, -1) if messages[i].get("role") == "user"), 0)
+    _truncate_tool_results(messages, 0, current, OLD_TOOL_RESULT_TOKENS)
+    _truncate_tool_results(messages, current, len(messages), TOOL_RESULT_TOKENS)
+
+    total = sum(message_tokens(message) for message in messages)
+
+    # Turnos antiguos: cada uno empieza en un mensaje del usuario
+    while total > budget:
+        first = next((i for i, message in enumerate(messages) if message.get("role") != "system"), None)
+        if first is None or first >= current:
+            break
+        end = next((i for i in range(first + 1, current + 1) if messages[i].get("role") == "user"), current)
+        total -= sum(message_tokens(message) for message in messages[first:end])
+        del messages[first:end]
+        current -= end - first
+
+    limit = TOOL_RESULT_TOKENS
+    while total > budget and limit > MIN_TOOL_RESULT_TOKENS:
+        limit = max(limit // 2, MIN_TOOL_RESULT_TOKENS)
+        _truncate_tool_results(messages, current, len(messages), limit)
+        total = sum(message_tokens(message) for message in messages)
+
+    return messages
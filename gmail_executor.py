@@ -0,0 +1,94 @@
+"""
+Pool de hilos gestionado para el trabajo bloqueante del servidor MCP
+
+googleapiclient es síncrono: si las herramientas lo llamasen directamente
+desde el event loop, un list_emails lento bloquearía a todos los clientes
+conectados (HTTP/SSE). Las herramientas son async y ejecutan su parte
+bloqueante en este pool, con un límite de llamadas simultáneas por usuario
+de Gmail para no superar los límites de concurrencia de la API.
+
+El contexto de la llamada (contextvars) viaja al hilo, así las métricas de
+server_metrics se siguen atribuyendo a la herramienta que hizo la petición.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+
+# Hilos del pool compartido por todas las sesiones MCP del proceso
+MAX_WORKERS = int(os.getenv("GMAIL_MAX_WORKERS", "16"))
+
+# Llamadas simultáneas a Gmail por usuario; el resto espera en el event loop sin ocupar hilos
+USER_CONCURRENCY = int(os.getenv("GMAIL_USER_CONCURRENCY", "4"))
+
+# El servidor usa una sola cuenta (token.pickle), 'me' para la API
+DEFAULT_USER = 'me'
+
+
+class GmailExecutor:
+    """ThreadPoolExecutor con semáforos por usuario, creado en el primer uso"""
+
+    def __init__(self, max_workers: int = MAX_WORKERS, user_concurrency: int = USER_CONCURRENCY):
+        self.max_workers = max_workers
+        self.user_concurrency = user_concurrency
+
+        self._executor = None
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="gmail")
+        return self._executor
+
+    def _semaphore(self, user: str) -> asyncio.Semaphore:
+        """Semáforo del usuario en el event loop actual"""
+        key = (asyncio.get_running_loop(), user)
+        semaphore = self._semaphores.get(key)
+        if semaphore is None:
+            semaphore = self._semaphores[key] = asyncio.Semaphore(max(1, self.user_concurrency))
+        return semaphore
+
+    async def run(self, fn, *args, user: str | None = DEFAULT_USER, **kwargs):
+        """
+        Ejecuta fn(*args, **kwargs) en el pool sin bloquear el event loop
+
+        Args:
+            fn: Función bloqueante
+            user: Usuario de Gmail cuyo límite de concurrencia aplica (None: sin límite, p. ej. PDFs)
+        """
+        call = functools.partial(contextvars.copy_context().run, fn, *args, **kwargs)
+        loop = asyncio.get_running_loop()
+        if user is None:
+            return await loop.run_in_executor(self.executor, call)
+        async with self._semaphore(user):
+            return await loop.run_in_executor(self.executor, call)
+
+    def shutdown(self):
+        """Espera a las llamadas en curso y libera los hilos"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+gmail_executor = GmailExecutor()
+
+
+def in_executor(user: str | None = DEFAULT_USER):
+    """
+    Decorador: convierte una función bloqueante en una corrutina que se ejecuta
+    en gmail_executor. Conserva la firma y el docstring (FastMCP los usa para el
+    esquema de la herramienta).
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            return await gmail_executor.run(fn, *args, user=user, **kwargs)
+        return wrapper
+    return decorator
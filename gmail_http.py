@@ -0,0 +1,29 @@
+"""
+Peticiones de googleapiclient instrumentadas para las métricas del servidor
+
+Vive aparte de gmail_session.py porque importa googleapiclient: solo se carga
+cuando se construye el servicio de Gmail, no al arrancar el servidor.
+"""
+
+from googleapiclient.http import BatchHttpRequest, HttpRequest
+from gmail_session import quota_units
+from server_metrics import metrics
+
+
+class InstrumentedHttpRequest(HttpRequest):
+    """HttpRequest que mide cada intento y suma su cuota a la herramienta en curso"""
+
+    def execute(self, http=None, num_retries=0):
+        metrics.add_quota(self.methodId, quota_units(self))
+        with metrics.timer(self.methodId):
+            return super().execute(http=http, num_retries=num_retries)
+
+
+class InstrumentedBatchHttpRequest(BatchHttpRequest):
+    """BatchHttpRequest que mide la petición y suma la cuota de cada parte"""
+
+    def execute(self, http=None):
+        for request in self._requests.values():
+            metrics.add_quota(request.methodId, quota_units(request))
+        with metrics.timer('gmail.batch'):
+            return super().execute(http=http)
@@ -3,47 +3,368 @@ Servidor MCP para gestionar Gmail
 Requiere: uv pip install fastmcp google-auth-oauthlib google-api-python-client
 """
 
-from fastmcp import FastMCP
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
+from fastmcp import FastMCP, Context
+from fastmcp.server.middleware import Middleware, MiddlewareContext
+from mcp.types import PromptMessage, TextContent
+from gmail_session import (MAX_BACKOFF, MAX_RETRIES, QUOTA_UNITS, WARMUP as GMAIL_WARMUP, QuotaLimiter,
+                           execute_with_retry, get_session, is_retryable)
+from gmail_mirror import MailboxMirror
+from gmail_query import UnsupportedQuery
+from gmail_mime import decode_body, find_body_part, get_header, html_to_text, list_attachments
+from manual_search import search as search_manual_index
+from manual_store import get_pages, get_section_text, get_sections, manual_path, parse_page_range, start_warm_up
+from server_metrics import MetricsMiddleware, metrics
+from gmail_executor import gmail_executor, in_executor
+import asyncio
 import base64
+import json
 from email.mime.text import MIMEText
+from string import Template
 import os.path
-import pickle
-
-# Configuración
-SCOPES = ['https://www.googleapis.com/auth/gmail.readonly', 
-          'https://www.googleapis.com/auth/gmail.send']
+import random
+import threading
+import time
 
 mcp = FastMCP("Gmail Manager")
 
+# Latencia y cuota de Gmail por herramienta (recurso metrics://server)
+mcp.add_middleware(MetricsMiddleware(metrics))
+
 def get_gmail_service():
-    """Obtiene el servicio de Gmail autenticado"""
-    creds = None
-    
-    # Token guardado previamente
-    if os.path.exists('token.pickle'):
-        with open('token.pickle', 'rb') as token:
-            creds = pickle.load(token)
-    
-    # Si no hay credenciales válidas, solicita login
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file('credentials.json', SCOPES)
-            creds = flow.run_local_server(port=0)
+    """Obtiene el servicio de Gmail autenticado (compartido por todo el proceso)"""
+    return get_session().service
+
+# Cabeceras que necesita list_emails (format=metadata evita descargar el cuerpo)
+LIST_HEADERS = ['Subject', 'From']
+
+# Peticiones por llamada al endpoint batch de Gmail (máximo 100, Google recomienda <= 50)
+BATCH_SIZE = int(os.getenv("GMAIL_BATCH_SIZE", "50"))
+
+# Envíos simultáneos de send_emails_bulk
+BULK_MAX_WORKERS = int(os.getenv("GMAIL_BULK_MAX_WORKERS", "4"))
+
+def fetch_messages_metadata(service, message_ids: list[str], headers: list[str] = LIST_HEADERS,
+                            batch_size: int = BATCH_SIZE, limiter: QuotaLimiter | None = None,
+                            max_retries: int = MAX_RETRIES) -> dict:
+    """
+    Obtiene los metadatos de varios mensajes agrupando las peticiones en batches
+    
+    Cada parte del batch cuenta como un messages.get para la cuota: el batch espera
+    a que el limitador tenga unidades para todas. Las partes que fallan por límite
+    de cuota o error del servidor se reintentan con backoff exponencial.
+    
+    Args:
+        service: Servicio de Gmail
+        message_ids: IDs de los mensajes
+        headers: Cabeceras a solicitar
+        batch_size: Mensajes por petición batch
+        limiter: Limitador de cuota (por defecto el de la sesión)
+        max_retries: Reintentos máximos de las partes fallidas
+    
+    Returns:
+        Diccionario {id: mensaje}; los mensajes borrados entretanto se omiten
+    """
+    batch_size = max(1, min(batch_size, 100))
+    limiter = get_session().quota if limiter is None else limiter
+    messages = {}
+    pending = list(message_ids)
+
+    for attempt in range(max_retries + 1):
+        failed = []
+        errors = {}
+
+        def callback(request_id, response, exception):
+            if exception is None:
+                messages[request_id] = response
+                return
+            status = getattr(getattr(exception, 'resp', None), 'status', None)
+            if status == 404:
+                return
+            errors[request_id] = exception
+            if is_retryable(exception):
+                failed.append(request_id)
+
+        for start in range(0, len(pending), batch_size):
+            chunk = pending[start:start + batch_size]
+            batch = service.new_batch_http_request(callback=callback)
+            for message_id in chunk:
+                batch.add(
+                    service.users().messages().get(
+                        userId='me',
+                        id=message_id,
+                        format='metadata',
+                        metadataHeaders=headers
+                    ),
+                    request_id=message_id
+                )
+            limiter.acquire(len(chunk) * QUOTA_UNITS['gmail.users.messages.get'])
+            try:
+                batch.execute()
+            except Exception as e:
+                # El batch entero falló (429/5xx): se reintentan todas sus partes
+                if not is_retryable(e):
+                    raise
+                for message_id in chunk:
+                    errors[message_id] = e
+                    failed.append(message_id)
+
+        if not errors:
+            break
+        if attempt == max_retries or len(failed) < len(errors):
+            raise next(iter(errors.values()))
+        pending = failed
+        time.sleep(min(2 ** attempt + random.random(), MAX_BACKOFF))
+
+    return messages
+
+def format_email(message_id: str, message: dict) -> dict:
+    """Convierte un mensaje de la API al formato que devuelve list_emails"""
+    headers = message['payload']['headers']
+    
+    subject = next((h['value'] for h in headers if h['name'] == 'Subject'), 'Sin asunto')
+    sender = next((h['value'] for h in headers if h['name'] == 'From'), 'Desconocido')
+    
+    return {
+        'id': message_id,
+        'subject': subject,
+        'from': sender,
+        'snippet': message['snippet']
+    }
+
+# Tamaño máximo de página de messages().list
+MAX_PAGE_SIZE = 500
+
+def iter_email_batches(service, query: str = "", max_results: int = 100, page_token: str = ""):
+    """
+    Recorre los emails página a página, entregando un lote por cada batch de metadatos
+    
+    La memoria queda acotada a una página: las páginas se piden con el tamaño justo
+    para no pasar de max_results, así el cursor final nunca salta mensajes.
+    
+    Yields:
+        (emails del lote, cursor desde el que reanudar tras este lote; None si no hay más)
+    """
+    remaining = max_results
+    
+    while remaining > 0:
+        request = service.users().messages().list(
+            userId='me',
+            maxResults=min(remaining, MAX_PAGE_SIZE),
+            q=query,
+            pageToken=page_token or None
+        )
+        results = execute_with_retry(request, get_session().quota)
+        
+        ids = [msg['id'] for msg in results.get('messages', [])]
+        next_page_token = results.get('nextPageToken')
+        remaining -= len(ids)
         
-        # Guarda las credenciales para la próxima vez
-        with open('token.pickle', 'wb') as token:
-            pickle.dump(creds, token)
+        for start in range(0, len(ids), BATCH_SIZE):
+            chunk = ids[start:start + BATCH_SIZE]
+            details = fetch_messages_metadata(service, chunk)
+            emails = [format_email(i, details[i]) for i in chunk if i in details]
+            # A mitad de página solo se puede reanudar desde el inicio de la página
+            last = start + BATCH_SIZE >= len(ids)
+            yield emails, (next_page_token if last else page_token or "")
+        
+        page_token = next_page_token
+        if not page_token or not ids:
+            break
+
+# Presupuesto por defecto del cuerpo decodificado de un email (bytes)
+BODY_MAX_BYTES = int(os.getenv("GMAIL_BODY_MAX_BYTES", "20000"))
+
+# Máximo que puede pedir un cliente con max_bytes en get_email / get_thread
+BODY_MAX_BYTES_LIMIT = int(os.getenv("GMAIL_BODY_MAX_BYTES_LIMIT", "1000000"))
+
+def clamp_body_bytes(max_bytes: int) -> int:
+    """Acota el max_bytes pedido por el cliente a [0, BODY_MAX_BYTES_LIMIT]"""
+    return min(max(0, max_bytes), BODY_MAX_BYTES_LIMIT)
+
+def format_message(service, message: dict, body_format: str = "text/plain",
+                   max_bytes: int = BODY_MAX_BYTES, include_attachments: bool = False) -> dict:
+    """
+    Convierte un mensaje completo de la API decodificando solo el cuerpo pedido
+    
+    Args:
+        service: Servicio de Gmail (para cuerpos grandes guardados como adjunto)
+        message: Mensaje obtenido con format='full'
+        body_format: "text/plain" o "text/html"
+        max_bytes: Presupuesto de bytes del cuerpo
+        include_attachments: Incluir la lista de adjuntos (sin descargarlos)
+    """
+    payload = message['payload']
+
+    def fetch_attachment(attachment_id):
+        return service.users().messages().attachments().get(
+            userId='me',
+            messageId=message['id'],
+            id=attachment_id
+        ).execute().get('data', '')
+
+    body, truncated, body_type = "", False, None
+    part = find_body_part(payload, body_format)
+    if part is not None:
+        body, truncated = decode_body(part, max_bytes, fetch_attachment)
+        body_type = part['mimeType']
+        if body_format == 'text/plain' and body_type == 'text/html':
+            body, body_type = html_to_text(body), 'text/plain'
+
+    email = {
+        'id': message['id'],
+        'thread_id': message.get('threadId'),
+        'subject': get_header(payload, 'Subject', 'Sin asunto'),
+        'from': get_header(payload, 'From', 'Desconocido'),
+        'to': get_header(payload, 'To'),
+        'date': get_header(payload, 'Date'),
+        'labels': message.get('labelIds', []),
+        'body': body,
+        'body_mime_type': body_type,
+        'body_truncated': truncated
+    }
+    if include_attachments:
+        email['attachments'] = list_attachments(payload)
+    return email
+
+def encode_message(message: MIMEText) -> str:
+    """Codifica un mensaje MIME en base64 para messages().send"""
+    return base64.urlsafe_b64encode(message.as_bytes()).decode()
+
+def bulk_message_error(item) -> str | None:
+    """Motivo por el que un mensaje de send_emails_bulk no se puede enviar (None si es válido)"""
+    if not isinstance(item, dict):
+        return "el mensaje debe ser un objeto"
+    if not isinstance(item.get('to'), str) or not item['to'].strip():
+        return "falta el destinatario (to)"
+    for key in ('subject', 'body'):
+        if key in item and not isinstance(item[key], str):
+            return f"{key} debe ser texto"
+    if not isinstance(item.get('variables', {}), dict):
+        return "variables debe ser un objeto"
+    return None
+
+def render_bulk_messages(messages: list, subject: str, body: str) -> list[tuple[dict, str | None, str | None]]:
+    """
+    Renderiza las plantillas de cada mensaje y lo codifica
+    
+    Los mensajes con el mismo asunto y cuerpo renderizados comparten el objeto
+    MIMEText (y su cuerpo ya codificado): solo se cambia la cabecera To.
+    Un mensaje mal formado no detiene el resto: se devuelve con su error.
+    
+    Returns:
+        Lista de (mensaje de entrada, raw en base64 o None, error o None)
+    """
+    mime_cache = {}
+    rendered = []
     
-    return build('gmail', 'v1', credentials=creds)
+    for item in messages:
+        error = bulk_message_error(item)
+        if error:
+            to = item.get('to') if isinstance(item, dict) else None
+            rendered.append(({'to': to, 'subject': subject}, None, error))
+            continue
+        
+        variables = {'to': item['to'], **item.get('variables', {})}
+        item_subject = Template(item.get('subject', subject)).safe_substitute(variables)
+        item_body = Template(item.get('body', body)).safe_substitute(variables)
+        
+        try:
+            mime = mime_cache.get((item_subject, item_body))
+            if mime is None:
+                mime = MIMEText(item_body)
+                mime['to'] = item['to']
+                mime['subject'] = item_subject
+                mime_cache[(item_subject, item_body)] = mime
+            else:
+                mime.replace_header('to', item['to'])
+            raw = encode_message(mime)
+        except Exception as e:
+            # p. ej. un salto de línea en la dirección (cabecera no válida)
+            mime_cache.pop((item_subject, item_body), None)
+            rendered.append(({**item, 'subject': item_subject}, None, str(e)))
+            continue
+        
+        rendered.append(({**item, 'subject': item_subject}, raw, None))
+    
+    return rendered
+
+# Espejo local opcional del buzón (desactivado si GMAIL_MIRROR_PATH está vacío)
+MIRROR_PATH = os.getenv("GMAIL_MIRROR_PATH", "")
+MIRROR_SYNC_INTERVAL = float(os.getenv("GMAIL_MIRROR_SYNC_INTERVAL", "30"))
+MIRROR_MAX_MESSAGES = int(os.getenv("GMAIL_MIRROR_MAX_MESSAGES", "5000"))
+
+_mirror = None
+_mirror_lock = threading.Lock()
+
+def get_mirror() -> MailboxMirror | None:
+    """Devuelve el espejo local sincronizado, o None si está desactivado o no se pudo sincronizar"""
+    global _mirror
+    if not MIRROR_PATH:
+        return None
+    if _mirror is None:
+        with _mirror_lock:
+            if _mirror is None:
+                _mirror = MailboxMirror(MIRROR_PATH, MIRROR_SYNC_INTERVAL, MIRROR_MAX_MESSAGES)
+    try:
+        with metrics.timer('mirror.sync'):
+            _mirror.sync(get_gmail_service(), fetch_messages_metadata, limiter=get_session().quota)
+    except Exception:
+        # Si no se puede sincronizar (cuota, red), la llamada se resuelve con la API
+        return None
+    return _mirror
+
+def search_mirror(max_results: int, query: str) -> list[dict] | None:
+    """Resuelve list_emails desde el espejo local si es posible"""
+    mirror = get_mirror()
+    if mirror is None:
+        return None
+
+    try:
+        emails = mirror.search(query, max_results)
+    except UnsupportedQuery:
+        return None
+
+    # Si el espejo no tiene todo el buzón, solo es fiable cuando llena el resultado
+    if not mirror.complete and len(emails) < max_results:
+        return None
+    return emails
+
+def search_emails(max_results: int = 10, query: str = "") -> list[dict]:
+    """Busca emails en el espejo local o, si no es posible, en la API"""
+    emails = search_mirror(max_results, query)
+    if emails is not None:
+        return emails
+
+    service = get_gmail_service()
+    
+    request = service.users().messages().list(
+        userId='me', 
+        maxResults=max_results,
+        q=query
+    )
+    results = execute_with_retry(request, get_session().quota)
+    
+    messages = results.get('messages', [])
+    details = fetch_messages_metadata(service, [msg['id'] for msg in messages])
+    
+    return [format_email(msg['id'], details[msg['id']]) for msg in messages if msg['id'] in details]
+
+def fetch_email(email_id: str, body_format: str = "text/plain", max_bytes: int = BODY_MAX_BYTES,
+                include_attachments: bool = False) -> dict:
+    """Descarga un email completo y decodifica solo el cuerpo pedido"""
+    service = get_gmail_service()
+    message = service.users().messages().get(userId='me', id=email_id, format='full').execute()
+    
+    return format_message(service, message, body_format, max_bytes, include_attachments)
 
 #========================= Tools ========================
 
+# Las herramientas y recursos que llaman a Gmail (o leen PDFs) son async: @in_executor
+# ejecuta su cuerpo bloqueante en el pool de gmail_executor.py y el event loop sigue
+# atendiendo a otros clientes mientras tanto
+
 @mcp.tool()
+@in_executor()
 def list_emails(max_results: int = 10, query: str = "") -> list[dict]:
     """
     Lista los emails recientes del usuario
@@ -55,35 +376,143 @@ def list_emails(max_results: int = 10, query: str = "") -> list[dict]:
     Returns:
         Lista de emails con id, asunto, remitente y snippet
     """
-    service = get_gmail_service()
+    return search_emails(max_results, query)
+
+@mcp.tool()
+@in_executor()
+def list_emails_page(page_size: int = 50, query: str = "", page_token: str = "") -> dict:
+    """
+    Lista una página de emails con paginación por cursor
     
-    results = service.users().messages().list(
-        userId='me', 
-        maxResults=max_results,
-        q=query
-    ).execute()
+    Args:
+        page_size: Emails por página (máximo 500)
+        query: Filtro de búsqueda de Gmail (ej: "from:juan@example.com", "is:unread")
+        page_token: Cursor devuelto por la página anterior (vacío para la primera)
+    
+    Returns:
+        Diccionario con los emails de la página y next_page_token (None si no hay más)
+    """
+    service = get_gmail_service()
     
-    messages = results.get('messages', [])
     emails = []
+    next_page_token = None
+    for batch, token in iter_email_batches(service, query, min(page_size, MAX_PAGE_SIZE), page_token):
+        emails.extend(batch)
+        next_page_token = token
     
-    for msg in messages:
-        # Obtener detalles del mensaje
-        message = service.users().messages().get(userId='me', id=msg['id']).execute()
-        headers = message['payload']['headers']
-        
-        subject = next((h['value'] for h in headers if h['name'] == 'Subject'), 'Sin asunto')
-        sender = next((h['value'] for h in headers if h['name'] == 'From'), 'Desconocido')
+    return {
+        'emails': emails,
+        'next_page_token': next_page_token
+    }
+
+@mcp.tool()
+async def stream_emails(ctx: Context, max_results: int = 100, query: str = "", page_token: str = "") -> dict:
+    """
+    Lista emails en streaming: cada lote se envía como notificación de progreso
+    en cuanto llegan sus metadatos, sin esperar al listado completo
+    
+    Args:
+        max_results: Número máximo de emails a recorrer
+        query: Filtro de búsqueda de Gmail
+        page_token: Cursor desde el que continuar
+    
+    Returns:
+        Número de emails enviados y next_page_token para continuar (los emails
+        viajan en el campo message de cada notificación, como JSON)
+    """
+    service = await gmail_executor.run(get_gmail_service)
+    batches = iter_email_batches(service, query, max_results, page_token)
+    
+    count = 0
+    next_page_token = None
+    while True:
+        # El generador hace llamadas bloqueantes a la API: se avanza en el pool de Gmail
+        item = await gmail_executor.run(next, batches, None)
+        if item is None:
+            break
         
-        emails.append({
-            'id': msg['id'],
-            'subject': subject,
-            'from': sender,
-            'snippet': message['snippet']
-        })
+        emails, next_page_token = item
+        count += len(emails)
+        await ctx.report_progress(
+            progress=count,
+            total=max_results,
+            message=json.dumps(emails, ensure_ascii=False)
+        )
     
-    return emails
+    return {
+        'count': count,
+        'next_page_token': next_page_token
+    }
+
+@mcp.tool()
+@in_executor()
+def get_email(email_id: str, body_format: str = "text/plain", max_bytes: int = BODY_MAX_BYTES,
+              include_attachments: bool = False) -> dict:
+    """
+    Obtiene un email con su cuerpo decodificado
+    
+    Args:
+        email_id: ID del email (de list_emails)
+        body_format: "text/plain" o "text/html"
+        max_bytes: Tamaño máximo del cuerpo (hasta GMAIL_BODY_MAX_BYTES_LIMIT); el resto se recorta (body_truncated=True)
+        include_attachments: Incluir nombre, tipo y tamaño de los adjuntos
+    
+    Returns:
+        Email con cabeceras, etiquetas y cuerpo
+    """
+    return fetch_email(email_id, body_format, clamp_body_bytes(max_bytes), include_attachments)
+
+@mcp.tool()
+@in_executor()
+def get_thread(thread_id: str, body_format: str = "text/plain", max_bytes: int = BODY_MAX_BYTES,
+               include_attachments: bool = False) -> dict:
+    """
+    Obtiene un hilo completo con el cuerpo de cada mensaje
+    
+    Args:
+        thread_id: ID del hilo
+        body_format: "text/plain" o "text/html"
+        max_bytes: Presupuesto total de cuerpo, repartido entre los mensajes del hilo
+        include_attachments: Incluir nombre, tipo y tamaño de los adjuntos
+    
+    Returns:
+        Hilo con id y lista de mensajes
+    """
+    service = get_gmail_service()
+    thread = service.users().threads().get(userId='me', id=thread_id, format='full').execute()
+    messages = thread.get('messages', [])
+    per_message = clamp_body_bytes(max_bytes) // max(len(messages), 1)
+    
+    return {
+        'id': thread['id'],
+        'messages': [
+            format_message(service, message, body_format, per_message, include_attachments)
+            for message in messages
+        ]
+    }
+
+@mcp.tool()
+@in_executor(user=None)
+def search_manual(query: str, version: str = "latest", top_k: int = 5) -> list[dict]:
+    """
+    Busca en el manual de configuración y devuelve los pasajes más relevantes
+    
+    Args:
+        query: Texto a buscar (ej: "variables de entorno", "credentials.json not found")
+        version: Versión del manual: latest, v1, v2 o v3
+        top_k: Número máximo de pasajes
+    
+    Returns:
+        Pasajes con puntuación, página, sección y texto
+    """
+    pdf_path, error = resolve_manual(version)
+    if error:
+        raise ValueError(error)
+    
+    return search_manual_index(pdf_path, query, top_k)
 
 @mcp.tool()
+@in_executor()
 def send_email(to: str, subject: str, body: str) -> dict:
     """
     Envía un email desde la cuenta del usuario
@@ -104,7 +533,7 @@ def send_email(to: str, subject: str, body: str) -> dict:
     message['subject'] = subject
     
     # Codificar en base64
-    raw = base64.urlsafe_b64encode(message.as_bytes()).decode()
+    raw = encode_message(message)
     
     # Enviar
     sent_message = service.users().messages().send(
@@ -120,15 +549,80 @@ def send_email(to: str, subject: str, body: str) -> dict:
     }
 
 
+@mcp.tool()
+async def send_emails_bulk(messages: list[dict] | None = None, recipients: list[str] | None = None,
+                           subject: str = "", body: str = "", max_workers: int = BULK_MAX_WORKERS) -> dict:
+    """
+    Envía muchos emails en paralelo con reintentos ante límites de cuota
+    
+    El asunto y el cuerpo son plantillas: $to y las claves de "variables" de cada
+    mensaje se sustituyen (ej: "Hola $nombre").
+    
+    Args:
+        messages: Lista de {"to", opcional "subject", "body", "variables": {...}}; los mal formados se devuelven como fallidos
+        recipients: Alternativa a messages: lista de direcciones con el mismo asunto y cuerpo
+        subject: Plantilla de asunto por defecto
+        body: Plantilla de cuerpo por defecto
+        max_workers: Envíos simultáneos (como mucho GMAIL_BULK_MAX_WORKERS)
+    
+    Returns:
+        Totales (enviados, fallidos, unidades de cuota) y el estado de cada mensaje
+    """
+    items = list(messages or []) + [{'to': to} for to in recipients or []]
+    rendered = await gmail_executor.run(render_bulk_messages, items, subject, body, user=None)
+    
+    session = get_session()
+    service = await gmail_executor.run(get_gmail_service)
+    
+    def send(item, raw):
+        request = service.users().messages().send(userId='me', body={'raw': raw})
+        usage = {}
+        result = {'to': item['to'], 'subject': item['subject']}
+        try:
+            sent_message = execute_with_retry(request, session.quota, usage=usage)
+        except Exception as e:
+            result.update(status='failed', error=str(e))
+        else:
+            result.update(status='sent', message_id=sent_message['id'])
+        result['attempts'] = usage.get('attempts', 0)
+        return result
+    
+    # Cada envío ocupa un hueco del límite por usuario de gmail_executor, compartido con
+    # el resto de herramientas; max_workers solo acota los de esta llamada
+    limit = asyncio.Semaphore(min(max(1, max_workers), BULK_MAX_WORKERS))
+    
+    async def send_entry(entry):
+        item, raw, error = entry
+        if error:
+            return {'to': item['to'], 'subject': item['subject'], 'status': 'failed', 'error': error, 'attempts': 0}
+        async with limit:
+            return await gmail_executor.run(send, item, raw)
+    
+    results = await asyncio.gather(*(send_entry(entry) for entry in rendered))
+    
+    sent = sum(1 for result in results if result['status'] == 'sent')
+    attempts = sum(result['attempts'] for result in results)
+    return {
+        'sent': sent,
+        'failed': len(results) - sent,
+        'quota_units': attempts * QUOTA_UNITS['gmail.users.messages.send'],
+        'results': results
+    }
+
+
 # ==================== RESOURCES ====================
 
 @mcp.resource("gmail://profile")
+@in_executor()
 def get_profile() -> str:
     """
     Recurso: Información del perfil del usuario en Gmail
     """
-    service = get_gmail_service()
-    profile = service.users().getProfile(userId='me').execute()
+    mirror = get_mirror()
+    profile = mirror.profile() if mirror is not None else None
+    if profile is None:
+        service = get_gmail_service()
+        profile = execute_with_retry(service.users().getProfile(userId='me'), get_session().quota)
 
     output = "# Perfil de Gmail\n\n"
     output += f"**Email:** {profile['emailAddress']}\n"
@@ -137,9 +631,64 @@ def get_profile() -> str:
 
     return output
 
+@mcp.resource("gmail://inbox-summary")
+@in_executor()
+def get_inbox_summary() -> str:
+    """
+    Recurso: Resumen de la bandeja de entrada (contadores y últimos no leídos)
+    """
+    service = get_gmail_service()
+    inbox = service.users().labels().get(userId='me', id='INBOX').execute()
+    unread = search_emails(max_results=10, query="is:unread in:inbox")
+
+    output = "# Resumen de la bandeja de entrada\n\n"
+    output += f"**Mensajes:** {inbox.get('messagesTotal', 0)}\n"
+    output += f"**No leídos:** {inbox.get('messagesUnread', 0)}\n"
+    output += f"**Hilos no leídos:** {inbox.get('threadsUnread', 0)}\n\n"
+    output += "## Últimos no leídos\n\n"
+    for email in unread:
+        output += f"- `{email['id']}` **{email['subject']}** — {email['from']}\n"
+
+    return output
+
+@mcp.resource("metrics://server")
+def get_server_metrics() -> str:
+    """
+    Recurso: Latencia por herramienta y operación (auth, llamadas a la API, PDFs) y cuota de Gmail consumida
+    """
+    return json.dumps(metrics.snapshot(), indent=2)
+
+@mcp.resource("metrics://server/prometheus")
+def get_server_metrics_prometheus() -> str:
+    """
+    Recurso: Las mismas métricas en formato de texto de Prometheus
+    """
+    return metrics.prometheus()
+
 # ==================== RESOURCE TEMPLATES ====================
 
+@mcp.resource("gmail://email/{email_id}")
+@in_executor()
+def get_email_resource(email_id: str) -> str:
+    """
+    Resource Template: Contenido de un email en texto plano (cuerpo recortado a GMAIL_BODY_MAX_BYTES)
+    """
+    email = fetch_email(email_id)
+
+    output = f"# {email['subject']}\n\n"
+    output += f"**De:** {email['from']}\n"
+    output += f"**Para:** {email['to']}\n"
+    output += f"**Fecha:** {email['date']}\n"
+    output += f"**Etiquetas:** {', '.join(email['labels'])}\n"
+    output += "---\n\n"
+    output += email['body']
+    if email['body_truncated']:
+        output += "\n\n[... contenido recortado ...]"
+
+    return output
+
 @mcp.resource("docs://setup-manual/{version}")
+@in_executor(user=None)
 def get_setup_manual(version: str = "latest") -> str:
     """
     Resource Template: Manual de configuración desde archivos PDF
@@ -150,72 +699,139 @@ def get_setup_manual(version: str = "latest") -> str:
     - docs://setup-manual/v2      → Segunda versión
     - docs://setup-manual/v3      → Tercera versión  
     """
-    import PyPDF2
+    # Determinar el archivo y verificar que existe
+    pdf_path, error = resolve_manual(version)
+    if error:
+        return error
+    
+    filename = os.path.basename(pdf_path)
 
-    # Mapeo de versiones
-    version_map = {
-        "latest": "manual_v3.pdf",
-        "v1": "manual_v1.pdf",
-        "v2": "manual_v2.pdf",
-        "v3": "manual_v3.pdf",
-    }
+    # Leer el PDF (texto cacheado por versión del fichero)
+    try:
+        pages = get_pages(pdf_path)
+    except Exception as e:
+        return f"Error al leer el PDF: {str(e)}"
+
+    full_text = "\n\n".join(pages)
 
-    # Determinar el archivo
-    filename = version_map.get(version.lower())
+    # Formatear la respuesta para el LLM
+    output = f"# Manual de Configuracion - {version.upper()}\n\n"
+    output += f"**Archivo:** {filename}\n"
+    output += f"**Paginas:** {len(pages)}\n"
+    output += f"**Ubicacion:** {pdf_path}\n"
+    output += "---\n\n"
+    output += full_text
 
-    if not filename:
-        return f"Version {version} no encontrada."
+    return output
     
-    # Construir la ruta del archivo
-    manuals_dir = os.path.join(os.path.dirname(__file__), 'manuals')
-    pdf_path = os.path.join(manuals_dir, filename)
 
-    # Verificar que la ruta existe
+def resolve_manual(version: str) -> tuple[str | None, str | None]:
+    """Ruta del manual de una versión, o el mensaje de error para el LLM"""
+    pdf_path = manual_path(version)
+    if not pdf_path:
+        return None, f"Version {version} no encontrada."
     if not os.path.exists(pdf_path):
-        return f"Archivo no encontrado: {pdf_path}"
-    
-    # Leer el PDF
+        return None, f"Archivo no encontrado: {pdf_path}"
+    return pdf_path, None
+
+@mcp.resource("docs://setup-manual/{version}/toc")
+@in_executor(user=None)
+def get_setup_manual_toc(version: str) -> str:
+    """
+    Resource Template: Índice de secciones del manual con su página
+
+    Ej: docs://setup-manual/latest/toc
+    """
+    pdf_path, error = resolve_manual(version)
+    if error:
+        return error
+
     try:
-        with open(pdf_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
+        pages = get_pages(pdf_path)
+        sections = get_sections(pdf_path)
+    except Exception as e:
+        return f"Error al leer el PDF: {str(e)}"
 
-            # Extraer metadatos
-            num_pages = len(pdf_reader.pages)
+    output = f"# Indice del Manual - {version.upper()}\n\n"
+    output += f"**Paginas:** {len(pages)}\n"
+    output += "---\n\n"
+    for section in sections:
+        output += f"- `{section['slug']}` {section['title']} (pagina {section['page']})\n"
 
-            # Extraer texto de todas las paginas
-            text_content = []
-            for page_num in range(num_pages):
-                page = pdf_reader.pages[page_num]
-                text_content.append(page.extract_text())
+    return output
 
-            full_text = "\n\n".join(text_content)
+@mcp.resource("docs://setup-manual/{version}/pages/{page_range}")
+@in_executor(user=None)
+def get_setup_manual_pages(version: str, page_range: str) -> str:
+    """
+    Resource Template: Páginas concretas del manual
 
-            # Formatear la respuesta para el LLM
-            output = f"# Manual de Configuracion - {version.upper()}\n\n"
-            output += f"**Archivo:** {filename}\n"
-            output += f"**Paginas:** {num_pages}\n"
-            output += f"**Ubicacion:** {pdf_path}\n"
-            output += "---\n\n"
-            output += full_text
+    Ej: docs://setup-manual/latest/pages/2, docs://setup-manual/v3/pages/1-2, .../pages/1,3
+    """
+    pdf_path, error = resolve_manual(version)
+    if error:
+        return error
 
-            return output
+    try:
+        pages = get_pages(pdf_path)
     except Exception as e:
         return f"Error al leer el PDF: {str(e)}"
+
+    try:
+        numbers = parse_page_range(page_range, len(pages))
+    except ValueError as e:
+        return str(e)
+
+    output = f"# Manual de Configuracion - {version.upper()} (paginas {page_range})\n\n"
+    output += f"**Archivo:** {os.path.basename(pdf_path)}\n"
+    output += f"**Paginas:** {len(pages)}\n"
+    output += "---\n\n"
+    output += "\n\n".join(f"[Pagina {n}]\n{pages[n - 1]}" for n in numbers)
+
+    return output
+
+@mcp.resource("docs://setup-manual/{version}/section/{slug}")
+@in_executor(user=None)
+def get_setup_manual_section(version: str, slug: str) -> str:
+    """
+    Resource Template: Una sección del manual (slugs en docs://setup-manual/{version}/toc)
+
+    Ej: docs://setup-manual/latest/section/variables-de-entorno
+    """
+    pdf_path, error = resolve_manual(version)
+    if error:
+        return error
+
+    try:
+        found = get_section_text(pdf_path, slug)
+    except Exception as e:
+        return f"Error al leer el PDF: {str(e)}"
+
+    if found is None:
+        return f"Seccion {slug} no encontrada. Consulta docs://setup-manual/{version}/toc"
+
+    section, text = found
+    output = f"# {section['title']} - Manual {version.upper()}\n\n"
+    output += f"**Pagina:** {section['page']}\n"
+    output += "---\n\n"
+    output += text
+
+    return output
     
 
 # ==================== PROMPTS ====================
 
 @mcp.prompt()
-def daily_email_summary() -> list[dict]:
+def daily_email_summary() -> list[PromptMessage]:
     """
     Prompt: Genera un resumen ejecutivo de los emails del día
     """
     return [
-        {
-            "role": "user",
-            "content": {
-                "type": "text",
-                "text": """Analiza mis emails de hoy y crea un resumen ejecutivo con:
+        PromptMessage(
+            role="user",
+            content=TextContent(
+                type="text",
+                text="""Analiza mis emails de hoy y crea un resumen ejecutivo con:
 
 1. **Emails Urgentes**: Mensajes que requieren respuesta inmediata
 2. **Tareas Pendientes**: Acciones que debo realizar
@@ -223,12 +839,12 @@ def daily_email_summary() -> list[dict]:
 4. **Puede Esperar**: Emails de baja prioridad
 
 Usa la herramienta list_emails con el filtro apropiado y presenta la información de forma clara y accionable."""
-            }
-        }
+            )
+        )
     ]
 
 @mcp.prompt()
-def compose_professional_email(recipient: str = "", subject: str = "") -> list[dict]:
+def compose_professional_email(recipient: str = "", subject: str = "") -> list[PromptMessage]:
     """
     Prompt: Asistente para redactar emails profesionales
     
@@ -246,26 +862,26 @@ Por favor:
 5. Cuando esté listo, usa la herramienta send_email para enviarlo"""
 
     return [
-        {
-            "role": "user",
-            "content": {
-                "type": "text",
-                "text": prompt_text
-            }
-        }
+        PromptMessage(
+            role="user",
+            content=TextContent(
+                type="text",
+                text=prompt_text
+            )
+        )
     ]
 
 @mcp.prompt()
-def email_automation_agent():
+def email_automation_agent() -> list[PromptMessage]:
     """
     Prompt que le da al LLM autonomía para ejecutar un workflow completo
     """
     return [
-        {
-            "role": "user",
-            "content": {
-                "type": "text",
-                "text": """Eres un agente de automatización de email. Tu misión:
+        PromptMessage(
+            role="user",
+            content=TextContent(
+                type="text",
+                text="""Eres un agente de automatización de email. Tu misión:
 
 FASE 1: ANÁLISIS
 1. Lee gmail://inbox-summary
@@ -303,13 +919,42 @@ IMPORTANTE:
 - Trabaja de forma autónoma pero transparente
 
 ¿Empezamos?"""
-            }
-        }
+            )
+        )
     ]
 
 
 
 # ========================= Main ========================
 
+# Precarga opcional del texto de los manuales al arrancar
+MANUALS_WARMUP = os.getenv("MANUALS_WARMUP", "").lower() in ("1", "true", "yes")
+
+def start_warm_ups():
+    """Precargas en segundo plano: sesión de Gmail (imports de Google y token) y manuales"""
+    if GMAIL_WARMUP:
+        get_session().start_warm_up()
+    if MANUALS_WARMUP:
+        start_warm_up()
+
+class WarmUpMiddleware(Middleware):
+    """
+    Lanza las precargas con la primera petición después del handshake
+
+    initialize no pasa por el middleware: así las precargas no compiten por
+    el GIL con el arranque y la primera respuesta al cliente.
+    """
+
+    def __init__(self):
+        self.started = False
+
+    async def on_request(self, context: MiddlewareContext, call_next):
+        if not self.started:
+            self.started = True
+            start_warm_ups()
+        return await call_next(context)
+
+mcp.add_middleware(WarmUpMiddleware())
+
 if __name__ == "__main__":
     mcp.run()
\ No newline at end of file
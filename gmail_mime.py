@@ -0,0 +1,115 @@
+"""
+Decodificación perezosa del árbol MIME de los mensajes de Gmail
+
+Solo se decodifica la parte de texto que pide el llamador, los adjuntos se
+describen sin descargarlos y el cuerpo se recorta a un presupuesto de bytes
+antes de decodificar el base64 completo.
+"""
+
+import base64
+import html
+import re
+
+# Tipos de cuerpo que se pueden pedir
+BODY_TYPES = ('text/plain', 'text/html')
+
+
+def iter_parts(payload: dict):
+    """Recorre el árbol MIME en profundidad sin decodificar nada"""
+    stack = [payload]
+    while stack:
+        part = stack.pop()
+        yield part
+        # Se apilan al revés para mantener el orden del mensaje
+        stack.extend(reversed(part.get('parts', [])))
+
+
+def is_attachment(part: dict) -> bool:
+    """True si la parte es un adjunto (tiene nombre de fichero)"""
+    return bool(part.get('filename'))
+
+
+def get_header(part: dict, name: str, default: str = "") -> str:
+    """Valor de una cabecera de la parte (sin distinguir mayúsculas)"""
+    name = name.lower()
+    return next((h['value'] for h in part.get('headers', []) if h['name'].lower() == name), default)
+
+
+def find_body_part(payload: dict, mime_type: str = 'text/plain') -> dict | None:
+    """
+    Busca la parte de cuerpo del tipo pedido; si no existe, la del otro tipo de texto
+
+    Returns:
+        La parte MIME o None si el mensaje no tiene cuerpo de texto
+    """
+    fallback = None
+    for part in iter_parts(payload):
+        if is_attachment(part) or part.get('mimeType') not in BODY_TYPES:
+            continue
+        if part['mimeType'] == mime_type:
+            return part
+        if fallback is None:
+            fallback = part
+    return fallback
+
+
+def _charset(part: dict) -> str:
+    match = re.search(r'charset="?([\w.:-]+)"?', get_header(part, 'Content-Type'), re.IGNORECASE)
+    return match.group(1) if match else 'utf-8'
+
+
+def decode_body(part: dict, max_bytes: int, fetch_attachment=None) -> tuple[str, bool]:
+    """
+    Decodifica el cuerpo de una parte, como mucho max_bytes
+
+    Args:
+        part: Parte MIME con body.data o body.attachmentId
+        max_bytes: Presupuesto de bytes del cuerpo decodificado
+        fetch_attachment: Función attachment_id -> data (base64url) para cuerpos grandes
+
+    Returns:
+        (texto, truncado)
+    """
+    body = part.get('body', {})
+    data = body.get('data')
+    if data is None and body.get('attachmentId') and fetch_attachment is not None:
+        data = fetch_attachment(body['attachmentId'])
+    if not data:
+        return "", False
+
+    # Un presupuesto negativo haría que los slices contasen desde el final
+    max_bytes = max(0, max_bytes)
+    # 4 caracteres base64 codifican 3 bytes: solo se decodifica el prefijo necesario
+    chunk = data[:(max_bytes + 2) // 3 * 4]
+    raw = base64.urlsafe_b64decode(chunk + '=' * (-len(chunk) % 4))[:max_bytes]
+    truncated = len(data.rstrip('=')) * 3 // 4 > max_bytes
+
+    # Un carácter multibyte cortado al final se descarta
+    try:
+        text = raw.decode(_charset(part), errors='ignore')
+    except LookupError:
+        text = raw.decode('utf-8', errors='ignore')
+    return text, truncated
+
+
+def html_to_text(content: str) -> str:
+    """Convierte HTML a texto plano de forma aproximada"""
+    content = re.sub(r'(?is)<(script|style)\b.*?</\1>', '', content)
+    content = re.sub(r'(?i)<br\s*/?>|</p>|</div>|</tr>|</h\d>', '\n', content)
+    content = re.sub(r'<[^>]+>', '', content)
+    content = html.unescape(content)
+    return re.sub(r'\n\s*\n+', '\n\n', content).strip()
+
+
+def list_attachments(payload: dict) -> list[dict]:
+    """Describe los adjuntos del mensaje sin descargarlos"""
+    return [
+        {
+            'filename': part['filename'],
+            'mime_type': part.get('mimeType'),
+            'size': part.get('body', {}).get('size', 0),
+            'attachment_id': part.get('body', {}).get('attachmentId')
+        }
+        for part in iter_parts(payload)
+        if is_attachment(part)
+    ]
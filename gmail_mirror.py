@@ -0,0 +1,289 @@
+"""
+Espejo local (SQLite) de los metadatos del buzón de Gmail
+
+Guarda etiquetas, cabeceras, snippet e internalDate de cada mensaje y se
+mantiene al día con los deltas de users.history.list a partir del último
+historyId visto, de modo que las consultas repetidas se sirven en local y la
+cuota de la API solo se gasta en los cambios.
+"""
+
+from gmail_query import compile_query
+from gmail_session import execute_with_retry
+import json
+import sqlite3
+import threading
+import time
+
+# Cabeceras que se guardan de cada mensaje
+MIRROR_HEADERS = ['Subject', 'From', 'To', 'Cc']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id TEXT PRIMARY KEY,
+    thread_id TEXT,
+    internal_date INTEGER,
+    subject TEXT,
+    sender TEXT,
+    recipients TEXT,
+    snippet TEXT,
+    mime_type TEXT,
+    size_estimate INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_messages_date ON messages(internal_date DESC);
+CREATE TABLE IF NOT EXISTS message_labels (
+    message_id TEXT,
+    label_id TEXT,
+    PRIMARY KEY (message_id, label_id)
+);
+CREATE INDEX IF NOT EXISTS idx_message_labels_label ON message_labels(label_id, message_id);
+CREATE TABLE IF NOT EXISTS labels (
+    id TEXT PRIMARY KEY,
+    name TEXT
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+class MailboxMirror:
+    """Espejo local de los metadatos del buzón"""
+
+    def __init__(self, path: str, sync_interval: float = 30, max_messages: int = 5000):
+        self.path = path
+        self.sync_interval = sync_interval
+        self.max_messages = max_messages
+
+        self._lock = threading.RLock()
+        self._last_sync = 0.0
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+
+    # ==================== META ====================
+
+    def _get_meta(self, key: str):
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row['value']) if row else None
+
+    def _set_meta(self, key: str, value):
+        self._db.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            (key, json.dumps(value))
+        )
+
+    @property
+    def complete(self) -> bool:
+        """True si el espejo contiene el buzón completo (no se alcanzó max_messages)"""
+        with self._lock:
+            return bool(self._get_meta('complete'))
+
+    # ==================== SINCRONIZACIÓN ====================
+
+    def sync(self, service, fetch_metadata, force: bool = False, limiter=None):
+        """
+        Pone el espejo al día con Gmail
+
+        Si falla, el siguiente intento espera también sync_interval: un error de
+        cuota no debe provocar una descarga completa del buzón en cada llamada.
+
+        Args:
+            service: Servicio de Gmail
+            fetch_metadata: Función (service, ids, headers) -> {id: mensaje}
+            force: Ignorar el intervalo mínimo entre sincronizaciones
+            limiter: Limitador de cuota para las peticiones de la sincronización
+        """
+        from googleapiclient.errors import HttpError
+
+        with self._lock:
+            if not force and time.monotonic() - self._last_sync < self.sync_interval:
+                return
+
+            try:
+                profile = execute_with_retry(service.users().getProfile(userId='me'), limiter)
+                history_id = self._get_meta('history_id')
+
+                if history_id is None:
+                    self._full_sync(service, fetch_metadata, profile['historyId'], limiter)
+                elif str(history_id) != str(profile['historyId']):
+                    try:
+                        self._incremental_sync(service, fetch_metadata, history_id, limiter)
+                    except HttpError as e:
+                        # historyId demasiado antiguo: Gmail ya no tiene ese historial
+                        if e.resp.status != 404:
+                            raise
+                        self._full_sync(service, fetch_metadata, profile['historyId'], limiter)
+
+                with self._db:
+                    self._set_meta('profile', profile)
+            finally:
+                self._last_sync = time.monotonic()
+
+    def _full_sync(self, service, fetch_metadata, history_id, limiter=None):
+        """Descarga los metadatos de los mensajes más recientes"""
+        # El historyId se toma antes de listar para no perder cambios concurrentes
+        message_ids = []
+        page_token = None
+        complete = True
+
+        # Incluye spam y papelera: in:spam, in:trash e in:anywhere se resuelven en local
+        # (compile_query los excluye por defecto, como Gmail) y history.list también los trae
+        while True:
+            request = service.users().messages().list(
+                userId='me',
+                maxResults=500,
+                includeSpamTrash=True,
+                pageToken=page_token
+            )
+            results = execute_with_retry(request, limiter)
+            message_ids.extend(msg['id'] for msg in results.get('messages', []))
+            page_token = results.get('nextPageToken')
+
+            if len(message_ids) >= self.max_messages:
+                complete = page_token is None and len(message_ids) == self.max_messages
+                message_ids = message_ids[:self.max_messages]
+                break
+            if not page_token:
+                break
+
+        details = fetch_metadata(service, message_ids, MIRROR_HEADERS)
+        labels = execute_with_retry(service.users().labels().list(userId='me'), limiter).get('labels', [])
+
+        with self._db:
+            self._db.execute("DELETE FROM messages")
+            self._db.execute("DELETE FROM message_labels")
+            self._db.execute("DELETE FROM labels")
+            self._db.executemany(
+                "INSERT INTO labels (id, name) VALUES (?, ?)",
+                [(label['id'], label['name']) for label in labels]
+            )
+            for message in details.values():
+                self._store_message(message)
+            self._set_meta('history_id', history_id)
+            self._set_meta('complete', complete)
+
+    def _incremental_sync(self, service, fetch_metadata, history_id, limiter=None):
+        """Aplica los cambios de users.history.list desde history_id"""
+        added = set()
+        deleted = set()
+        relabeled = {}
+        page_token = None
+
+        while True:
+            request = service.users().history().list(
+                userId='me',
+                startHistoryId=history_id,
+                pageToken=page_token
+            )
+            results = execute_with_retry(request, limiter)
+
+            for record in results.get('history', []):
+                for item in record.get('messagesAdded', []):
+                    added.add(item['message']['id'])
+                    deleted.discard(item['message']['id'])
+                for item in record.get('messagesDeleted', []):
+                    deleted.add(item['message']['id'])
+                    added.discard(item['message']['id'])
+                for key in ('labelsAdded', 'labelsRemoved'):
+                    for item in record.get(key, []):
+                        message = item['message']
+                        relabeled[message['id']] = message.get('labelIds', [])
+
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                new_history_id = results.get('historyId', history_id)
+                break
+
+        details = fetch_metadata(service, sorted(added), MIRROR_HEADERS) if added else {}
+
+        with self._db:
+            for message_id in deleted:
+                self._delete_message(message_id)
+            for message in details.values():
+                self._store_message(message)
+            for message_id, label_ids in relabeled.items():
+                if message_id in deleted or message_id in details:
+                    continue
+                # Solo mensajes presentes en el espejo (los más antiguos pueden no estarlo)
+                if self._db.execute("SELECT 1 FROM messages WHERE id = ?", (message_id,)).fetchone():
+                    self._set_labels(message_id, label_ids)
+            self._set_meta('history_id', new_history_id)
+
+    # ==================== ESCRITURA ====================
+
+    def _store_message(self, message: dict):
+        headers = {h['name']: h['value'] for h in message.get('payload', {}).get('headers', [])}
+        recipients = ", ".join(v for v in (headers.get('To'), headers.get('Cc')) if v)
+
+        self._db.execute(
+            """INSERT OR REPLACE INTO messages
+               (id, thread_id, internal_date, subject, sender, recipients, snippet, mime_type, size_estimate)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (
+                message['id'],
+                message.get('threadId'),
+                int(message.get('internalDate', 0)),
+                headers.get('Subject'),
+                headers.get('From'),
+                recipients,
+                message.get('snippet', ''),
+                message.get('payload', {}).get('mimeType'),
+                message.get('sizeEstimate'),
+            )
+        )
+        self._set_labels(message['id'], message.get('labelIds', []))
+
+    def _set_labels(self, message_id: str, label_ids: list[str]):
+        self._db.execute("DELETE FROM message_labels WHERE message_id = ?", (message_id,))
+        self._db.executemany(
+            "INSERT INTO message_labels (message_id, label_id) VALUES (?, ?)",
+            [(message_id, label_id) for label_id in label_ids]
+        )
+
+    def _delete_message(self, message_id: str):
+        self._db.execute("DELETE FROM messages WHERE id = ?", (message_id,))
+        self._db.execute("DELETE FROM message_labels WHERE message_id = ?", (message_id,))
+
+    # ==================== CONSULTAS ====================
+
+    def profile(self) -> dict | None:
+        """Último perfil de Gmail obtenido durante la sincronización"""
+        with self._lock:
+            return self._get_meta('profile')
+
+    def resolve_label(self, name: str) -> str | None:
+        """Busca el ID de una etiqueta por ID o por nombre (como en label: de Gmail)"""
+        wanted = name.lower().replace(' ', '-').replace('/', '-')
+        for row in self._db.execute("SELECT id, name FROM labels"):
+            if row['id'].lower() == wanted or row['name'].lower().replace(' ', '-').replace('/', '-') == wanted:
+                return row['id']
+        return None
+
+    def search(self, query: str, limit: int) -> list[dict]:
+        """
+        Evalúa una búsqueda de Gmail sobre el espejo, del mensaje más reciente al más antiguo
+
+        Raises:
+            UnsupportedQuery: Si la búsqueda no se puede resolver en local
+
+        Returns:
+            Lista de emails con id, asunto, remitente y snippet
+        """
+        with self._lock:
+            where, params = compile_query(query, self.resolve_label)
+            rows = self._db.execute(
+                f"SELECT id, subject, sender, snippet FROM messages m WHERE {where} "
+                f"ORDER BY internal_date DESC LIMIT ?",
+                params + [limit]
+            ).fetchall()
+
+        return [
+            {
+                'id': row['id'],
+                'subject': row['subject'] or 'Sin asunto',
+                'from': row['sender'] or 'Desconocido',
+                'snippet': row['snippet']
+            }
+            for row in rows
+        ]
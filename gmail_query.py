@@ -0,0 +1,262 @@
+"""
+Motor de búsqueda local con la sintaxis de Gmail
+
+Traduce una búsqueda de Gmail (from:, to:, subject:, is:, in:, label:,
+after:/before:, newer_than:/older_than:, larger:/smaller:, OR, negación
+con - y paréntesis) a una cláusula WHERE de SQLite sobre el espejo local.
+Si la búsqueda usa algo que no se puede evaluar exactamente en local (p.ej.
+texto libre, que Gmail busca también en el cuerpo, o has:attachment, que
+depende de la estructura MIME completa) se lanza UnsupportedQuery y el
+llamador debe consultar la API remota.
+"""
+
+import datetime
+import re
+import time
+
+
+class UnsupportedQuery(Exception):
+    """La búsqueda no se puede resolver con los metadatos locales"""
+
+
+# Etiqueta del sistema equivalente a cada is:/in:
+IS_LABELS = {
+    'unread': 'UNREAD',
+    'starred': 'STARRED',
+    'important': 'IMPORTANT',
+}
+IN_LABELS = {
+    'inbox': 'INBOX',
+    'sent': 'SENT',
+    'drafts': 'DRAFT',
+    'spam': 'SPAM',
+    'trash': 'TRASH',
+    'starred': 'STARRED',
+    'important': 'IMPORTANT',
+    'unread': 'UNREAD',
+}
+NEGATED_IS = {
+    'read': 'UNREAD',
+    'unstarred': 'STARRED',
+    'unimportant': 'IMPORTANT',
+}
+
+# Columnas de texto de cada operador
+TEXT_COLUMNS = {
+    'from': 'sender',
+    'to': 'recipients',
+    'subject': 'subject',
+}
+
+# Segundos por unidad de newer_than:/older_than:
+PERIOD_SECONDS = {'d': 86400, 'm': 30 * 86400, 'y': 365 * 86400}
+SIZE_UNITS = {'': 1, 'k': 1024, 'm': 1024 * 1024}
+
+LABEL_SQL = "EXISTS (SELECT 1 FROM message_labels l WHERE l.message_id = m.id AND l.label_id = ?)"
+
+
+# ==================== TOKENIZADOR ====================
+
+def tokenize(query: str) -> list[tuple]:
+    """Divide la búsqueda en tokens: ('(',), (')',), ('-',), ('OR',), ('term', op, valor)"""
+    tokens = []
+    i = 0
+    n = len(query)
+
+    while i < n:
+        char = query[i]
+        if char.isspace():
+            i += 1
+        elif char in '()':
+            tokens.append((char,))
+            i += 1
+        elif char == '-' and i + 1 < n and not query[i + 1].isspace():
+            tokens.append(('-',))
+            i += 1
+        elif char in '{}':
+            raise UnsupportedQuery("Grupos {} no soportados")
+        elif char == '"':
+            raise UnsupportedQuery("Búsqueda de texto libre no soportada")
+        else:
+            match = re.match(r'([A-Za-z_]+):', query[i:])
+            if not match:
+                word = re.match(r'[^\s()]+', query[i:]).group(0)
+                i += len(word)
+                if word in ('OR', '|'):
+                    tokens.append(('OR',))
+                elif word != 'AND':
+                    raise UnsupportedQuery(f"Búsqueda de texto libre no soportada: {word}")
+                continue
+
+            op = match.group(1).lower()
+            i += len(match.group(0))
+            if i < n and query[i] == '"':
+                end = query.find('"', i + 1)
+                if end == -1:
+                    raise UnsupportedQuery("Comillas sin cerrar")
+                value = query[i + 1:end]
+                i = end + 1
+            elif i < n and query[i] == '(':
+                raise UnsupportedQuery(f"Grupos en {op}: no soportados")
+            else:
+                value = re.match(r'[^\s()]*', query[i:]).group(0)
+                i += len(value)
+            if not value:
+                raise UnsupportedQuery(f"Operador {op}: sin valor")
+            tokens.append(('term', op, value))
+
+    return tokens
+
+
+# ==================== PARSER ====================
+
+class _Parser:
+    """Parser descendente; como en Gmail, OR tiene más precedencia que el AND implícito"""
+
+    def __init__(self, tokens: list[tuple], resolve_label):
+        self.tokens = tokens
+        self.pos = 0
+        self.resolve_label = resolve_label
+        self.params = []
+        # Si la búsqueda menciona spam/papelera no se excluyen por defecto
+        self.includes_hidden = False
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def next(self):
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def parse_and(self) -> str:
+        parts = []
+        while self.peek() is not None and self.peek()[0] != ')':
+            parts.append(self.parse_or())
+        if not parts:
+            return "1"
+        return " AND ".join(parts) if len(parts) == 1 else "(" + " AND ".join(parts) + ")"
+
+    def parse_or(self) -> str:
+        parts = [self.parse_unary()]
+        while self.peek() == ('OR',):
+            self.next()
+            parts.append(self.parse_unary())
+        return parts[0] if len(parts) == 1 else "(" + " OR ".join(parts) + ")"
+
+    def parse_unary(self) -> str:
+        if self.peek() == ('-',):
+            self.next()
+            return f"NOT {self.parse_atom()}"
+        return self.parse_atom()
+
+    def parse_atom(self) -> str:
+        token = self.next()
+        if token is None:
+            raise UnsupportedQuery("Búsqueda incompleta")
+        if token == ('(',):
+            sql = self.parse_and()
+            if self.next() != (')',):
+                raise UnsupportedQuery("Paréntesis sin cerrar")
+            return f"({sql})"
+        if token[0] != 'term':
+            raise UnsupportedQuery(f"Token inesperado: {token[0]}")
+        return self.compile_term(token[1], token[2])
+
+    # ==================== OPERADORES ====================
+
+    def compile_term(self, op: str, value: str) -> str:
+        lowered = value.lower()
+
+        if op in TEXT_COLUMNS:
+            if lowered == 'me':
+                if op != 'from':
+                    raise UnsupportedQuery(f"{op}:me no soportado")
+                return self.label('SENT')
+            escaped = value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            self.params.append(f"%{escaped}%")
+            return f"COALESCE(m.{TEXT_COLUMNS[op]}, '') LIKE ? ESCAPE '\\'"
+
+        if op == 'is':
+            if lowered in IS_LABELS:
+                return self.label(IS_LABELS[lowered])
+            if lowered in NEGATED_IS:
+                return f"NOT {self.label(NEGATED_IS[lowered])}"
+
+        if op == 'in':
+            if lowered == 'anywhere':
+                self.includes_hidden = True
+                return "1"
+            if lowered in IN_LABELS:
+                return self.label(IN_LABELS[lowered])
+
+        if op == 'label':
+            label_id = self.resolve_label(value)
+            if label_id is None:
+                raise UnsupportedQuery(f"Etiqueta desconocida: {value}")
+            return self.label(label_id)
+
+        if op in ('after', 'before'):
+            timestamp = parse_date(value)
+            self.params.append(timestamp * 1000)
+            return "m.internal_date >= ?" if op == 'after' else "m.internal_date < ?"
+
+        if op in ('newer_than', 'older_than'):
+            match = re.fullmatch(r'(\d+)([dmy])', lowered)
+            if not match:
+                raise UnsupportedQuery(f"Periodo no válido: {value}")
+            cutoff = time.time() - int(match.group(1)) * PERIOD_SECONDS[match.group(2)]
+            self.params.append(int(cutoff * 1000))
+            return "m.internal_date > ?" if op == 'newer_than' else "m.internal_date <= ?"
+
+        if op in ('larger', 'smaller', 'size'):
+            match = re.fullmatch(r'(\d+)([km]?)', lowered)
+            if not match:
+                raise UnsupportedQuery(f"Tamaño no válido: {value}")
+            self.params.append(int(match.group(1)) * SIZE_UNITS[match.group(2)])
+            return "m.size_estimate < ?" if op == 'smaller' else "m.size_estimate > ?"
+
+        raise UnsupportedQuery(f"Operador no soportado: {op}:{value}")
+
+    def label(self, label_id: str) -> str:
+        if label_id in ('SPAM', 'TRASH'):
+            self.includes_hidden = True
+        self.params.append(label_id)
+        return LABEL_SQL
+
+
+def parse_date(value: str) -> int:
+    """Convierte una fecha de Gmail (YYYY/MM/DD, YYYY-MM-DD o epoch) a segundos epoch"""
+    if value.isdigit():
+        return int(value)
+    for fmt in ('%Y/%m/%d', '%Y-%m-%d', '%m/%d/%Y'):
+        try:
+            date = datetime.datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        # Gmail interpreta las fechas como medianoche en la zona horaria local
+        return int(time.mktime(date.timetuple()))
+    raise UnsupportedQuery(f"Fecha no válida: {value}")
+
+
+def compile_query(query: str, resolve_label) -> tuple[str, list]:
+    """
+    Compila una búsqueda de Gmail a SQL sobre la tabla messages (alias m)
+
+    Args:
+        query: Búsqueda con sintaxis de Gmail
+        resolve_label: Función nombre_etiqueta -> ID de etiqueta (o None)
+
+    Returns:
+        (cláusula WHERE, parámetros)
+    """
+    parser = _Parser(tokenize(query), resolve_label)
+    where = parser.parse_and()
+    if parser.peek() is not None:
+        raise UnsupportedQuery("Paréntesis sin abrir")
+
+    if not parser.includes_hidden:
+        where = f"{where} AND NOT EXISTS (SELECT 1 FROM message_labels h " \
+                f"WHERE h.message_id = m.id AND h.label_id IN ('SPAM', 'TRASH'))"
+
+    return where, parser.params
@@ -0,0 +1,327 @@
+"""
+Sesión de Gmail de larga duración para el servidor MCP
+
+Construye el cliente de la API una sola vez por proceso (el documento de
+discovery se parsea una vez), reutiliza conexiones HTTP keep-alive por hilo
+y refresca las credenciales en segundo plano antes de que expiren.
+
+Las librerías de Google (googleapiclient, google-auth, oauthlib, httplib2)
+se importan en el primer uso de Gmail y no al importar el módulo: el servidor
+arranca por stdio en cada sesión y la mayoría de peticiones del handshake
+(listados, prompts, manuales) no las necesitan.
+"""
+
+from urllib.parse import urljoin
+from server_metrics import metrics
+import datetime
+import importlib
+import os.path
+import pickle
+import random
+import threading
+import time
+
+# Configuración
+SCOPES = ['https://www.googleapis.com/auth/gmail.readonly',
+          'https://www.googleapis.com/auth/gmail.send']
+
+TOKEN_FILE = 'token.pickle'
+CREDENTIALS_FILE = 'credentials.json'
+
+# Segundos antes de la expiración en los que se refresca el token en segundo plano.
+# Debe ser mayor que el margen de google-auth (~4 min) para que ninguna petición
+# tenga que refrescar el token en línea.
+REFRESH_MARGIN = int(os.getenv("GMAIL_REFRESH_MARGIN", "300"))
+REFRESH_RETRY = 60
+HTTP_TIMEOUT = int(os.getenv("GMAIL_HTTP_TIMEOUT", "60"))
+
+# Precarga de la sesión en segundo plano tras el handshake (ver GmailSession.start_warm_up)
+WARMUP = os.getenv("GMAIL_WARMUP", "1").lower() in ("1", "true", "yes")
+
+# Endpoint alternativo de la API (p. ej. benchmarks/fake_gmail.py). Con él no se usan credenciales.
+API_ENDPOINT = os.getenv("GMAIL_API_ENDPOINT")
+API_ROOT_URL = 'https://gmail.googleapis.com/'
+
+# Unidades de cuota por método (https://developers.google.com/gmail/api/reference/quota)
+QUOTA_UNITS = {
+    'gmail.users.getProfile': 1,
+    'gmail.users.labels.list': 1,
+    'gmail.users.labels.get': 1,
+    'gmail.users.history.list': 2,
+    'gmail.users.messages.list': 5,
+    'gmail.users.messages.get': 5,
+    'gmail.users.messages.attachments.get': 5,
+    'gmail.users.threads.get': 10,
+    'gmail.users.messages.send': 100,
+}
+DEFAULT_QUOTA_UNITS = 5
+
+# Límite por usuario de Gmail: 250 unidades por segundo
+QUOTA_UNITS_PER_SECOND = float(os.getenv("GMAIL_QUOTA_UNITS_PER_SECOND", "250"))
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+MAX_RETRIES = int(os.getenv("GMAIL_MAX_RETRIES", "5"))
+MAX_BACKOFF = 32
+
+
+def quota_units(request) -> int:
+    """Unidades de cuota que consume una petición de la API"""
+    return QUOTA_UNITS.get(getattr(request, 'methodId', None), DEFAULT_QUOTA_UNITS)
+
+
+def is_retryable(error: Exception) -> bool:
+    """True para errores de límite de cuota (429 o 403 rateLimitExceeded) y 5xx"""
+    from googleapiclient.errors import HttpError
+
+    if not isinstance(error, HttpError):
+        return False
+    if error.resp.status in RETRYABLE_STATUS:
+        return True
+    return error.resp.status == 403 and b'ratelimitexceeded' in (error.content or b'').lower()
+
+
+class QuotaLimiter:
+    """Token bucket de unidades de cuota compartido entre hilos"""
+
+    def __init__(self, units_per_second: float = QUOTA_UNITS_PER_SECOND):
+        self.rate = units_per_second
+        self._available = units_per_second
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, units: int):
+        """
+        Consume las unidades y bloquea hasta que estén disponibles
+
+        Las unidades se reservan en el acto y el saldo puede quedar en negativo:
+        quien llega después espera también esa deuda, y una petición que cuesta
+        más que el bucket entero (p. ej. un envío de 100 con 50/s) no se bloquea
+        para siempre.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._available = min(self.rate, self._available + (now - self._updated) * self.rate)
+            self._updated = now
+            self._available -= units
+            wait = -self._available / self.rate if self._available < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+def execute_with_retry(request, limiter: QuotaLimiter | None = None, max_retries: int = MAX_RETRIES,
+                       usage: dict | None = None):
+    """
+    Ejecuta una petición con backoff exponencial ante límites de cuota y errores 5xx
+
+    Args:
+        request: Petición de googleapiclient
+        limiter: Limitador de cuota a respetar antes de cada intento
+        max_retries: Reintentos máximos
+        usage: Diccionario donde acumular 'attempts' y 'quota_units' consumidos
+
+    Returns:
+        La respuesta de la API
+    """
+    from googleapiclient.errors import HttpError
+
+    units = quota_units(request)
+    for attempt in range(max_retries + 1):
+        if limiter is not None:
+            limiter.acquire(units)
+        if usage is not None:
+            usage['attempts'] = usage.get('attempts', 0) + 1
+            usage['quota_units'] = usage.get('quota_units', 0) + units
+        try:
+            return request.execute()
+        except HttpError as e:
+            if attempt == max_retries or not is_retryable(e):
+                raise
+            time.sleep(min(2 ** attempt + random.random(), MAX_BACKOFF))
+
+
+class GmailSession:
+    """Servicio de Gmail compartido y seguro entre hilos"""
+
+    def __init__(self, scopes=SCOPES, token_file=TOKEN_FILE, credentials_file=CREDENTIALS_FILE,
+                 api_endpoint=API_ENDPOINT):
+        self.scopes = scopes
+        self.token_file = token_file
+        self.credentials_file = credentials_file
+        self.api_endpoint = api_endpoint
+
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._auth_request = None
+        self._creds = None
+        self._service = None
+        self._refresh_timer = None
+        self.quota = QuotaLimiter()
+
+    @property
+    def service(self):
+        """Cliente de la API de Gmail, construido una sola vez"""
+        if self._service is None:
+            with self._lock:
+                if self._service is None:
+                    with metrics.timer('auth.load_credentials'):
+                        self._creds = self._anonymous_credentials() if self.api_endpoint else self._load_credentials()
+                    with metrics.timer('gmail.build_service'):
+                        self._service = self._build_service()
+                    self._schedule_refresh()
+        return self._service
+
+    def _build_service(self):
+        """Cliente de la API con peticiones instrumentadas (y contra API_ENDPOINT si está definido)"""
+        from googleapiclient.discovery import build
+        from gmail_http import InstrumentedBatchHttpRequest
+
+        options = {'client_options': {'api_endpoint': self.api_endpoint}} if self.api_endpoint else {}
+        service = build(
+            'gmail', 'v1',
+            credentials=self._creds,
+            requestBuilder=self._build_request,
+            cache_discovery=False,
+            **options
+        )
+        # La URL de /batch sale del documento de discovery, no de api_endpoint
+        batch_uri = urljoin(self.api_endpoint or API_ROOT_URL, 'batch')
+        service.new_batch_http_request = lambda callback=None: InstrumentedBatchHttpRequest(
+            callback=callback, batch_uri=batch_uri
+        )
+        return service
+
+    @property
+    def http(self):
+        """Transporte HTTP autorizado del hilo actual (httplib2 no es thread-safe)"""
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            import google_auth_httplib2
+            import httplib2
+
+            http = google_auth_httplib2.AuthorizedHttp(
+                self._creds,
+                http=httplib2.Http(timeout=HTTP_TIMEOUT)
+            )
+            self._local.http = http
+        return http
+
+    def _build_request(self, http, *args, **kwargs):
+        """requestBuilder: cada petición usa la conexión keep-alive de su hilo"""
+        from gmail_http import InstrumentedHttpRequest
+
+        return InstrumentedHttpRequest(self.http, *args, **kwargs)
+
+    # ==================== CREDENCIALES ====================
+
+    def _request(self):
+        """Transporte de google-auth para refrescar el token (sesión de requests reutilizada)"""
+        if self._auth_request is None:
+            from google.auth.transport.requests import Request
+            import requests
+
+            self._auth_request = Request(requests.Session())
+        return self._auth_request
+
+    @staticmethod
+    def _anonymous_credentials():
+        from google.auth.credentials import AnonymousCredentials
+
+        return AnonymousCredentials()
+
+    def _load_credentials(self):
+        """Carga las credenciales guardadas o solicita login"""
+        creds = None
+
+        # Token guardado previamente
+        if os.path.exists(self.token_file):
+            with open(self.token_file, 'rb') as token:
+                creds = pickle.load(token)
+
+        # Si no hay credenciales válidas, solicita login
+        if not creds or not creds.valid:
+            if creds and creds.expired and creds.refresh_token:
+                creds.refresh(self._request())
+            else:
+                from google_auth_oauthlib.flow import InstalledAppFlow
+
+                flow = InstalledAppFlow.from_client_secrets_file(self.credentials_file, self.scopes)
+                creds = flow.run_local_server(port=0)
+
+            self._save_credentials(creds)
+
+        return creds
+
+    def _save_credentials(self, creds):
+        """Guarda las credenciales para la próxima vez"""
+        with open(self.token_file, 'wb') as token:
+            pickle.dump(creds, token)
+
+    def _schedule_refresh(self, delay=None):
+        """Programa el siguiente refresco del token antes de que expire"""
+        if delay is None:
+            expiry = getattr(self._creds, 'expiry', None)
+            if expiry is None or not getattr(self._creds, 'refresh_token', None):
+                return
+            # google-auth guarda la expiración como datetime UTC sin zona horaria
+            now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+            delay = max((expiry - now).total_seconds() - REFRESH_MARGIN, 0)
+
+        timer = threading.Timer(delay, self._refresh)
+        timer.daemon = True
+        self._refresh_timer = timer
+        timer.start()
+
+    def _refresh(self):
+        """Refresca el token en segundo plano y lo persiste"""
+        try:
+            with self._lock, metrics.timer('auth.refresh'):
+                self._creds.refresh(self._request())
+                self._save_credentials(self._creds)
+        except Exception:
+            # Reintenta más tarde; si el token llega a expirar, AuthorizedHttp lo refresca en línea
+            self._schedule_refresh(REFRESH_RETRY)
+        else:
+            self._schedule_refresh()
+
+    def warm_up(self):
+        """
+        Importa las librerías de Google y construye el servicio si ya hay token
+
+        Sin token no se lanza el login (abriría el navegador sin que nadie lo
+        haya pedido); se hará en la primera llamada a Gmail, como siempre.
+        """
+        try:
+            if self.api_endpoint or os.path.exists(self.token_file):
+                self.service
+            else:
+                # Solo para cargarlos en memoria: el primer uso de Gmail ya no paga el import
+                importlib.import_module('googleapiclient.discovery')
+                importlib.import_module('gmail_http')
+        except Exception:
+            # El error se repetirá (y se verá) en la primera llamada a Gmail
+            pass
+
+    def start_warm_up(self) -> threading.Thread:
+        """Precarga la sesión en segundo plano"""
+        thread = threading.Thread(target=self.warm_up, name="gmail-warm-up", daemon=True)
+        thread.start()
+        return thread
+
+    def close(self):
+        """Detiene el refresco en segundo plano"""
+        if self._refresh_timer is not None:
+            self._refresh_timer.cancel()
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> GmailSession:
+    """Devuelve la sesión de Gmail del proceso"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = GmailSession()
+    return _session
@@ -0,0 +1,116 @@
+"""
+Búsqueda de texto completo (BM25) sobre los manuales de configuración
+
+Cada manual se divide en pasajes alineados con sus encabezados y se indexa
+en un índice invertido que se guarda en manuals/.cache junto al texto
+extraído; solo se reconstruye cuando cambia el PDF.
+"""
+
+from manual_store import cached, clean_line, get_pages, get_sections
+import math
+import re
+import unicodedata
+
+# Parámetros clásicos de BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Líneas máximas por pasaje (los encabezados siempre empiezan uno nuevo)
+PASSAGE_LINES = 12
+
+STOPWORDS = {
+    'a', 'al', 'con', 'de', 'del', 'el', 'en', 'es', 'la', 'las', 'lo', 'los', 'o', 'para',
+    'por', 'que', 'se', 'si', 'su', 'sus', 'tu', 'un', 'una', 'y', 'como', 'mi', 'mis',
+    'the', 'and', 'of', 'to', 'in', 'is', 'for', 'on',
+}
+
+_indexes = {}
+
+
+def tokenize(text: str) -> list[str]:
+    """Términos en minúsculas y sin acentos, sin palabras vacías"""
+    text = unicodedata.normalize('NFKD', text.lower()).encode('ascii', 'ignore').decode()
+    return [token for token in re.findall(r'[a-z0-9_]+', text)
+            if len(token) > 1 and token not in STOPWORDS]
+
+
+def build_passages(pages: list[str], sections: list[dict]) -> list[dict]:
+    """Divide el manual en pasajes de como mucho PASSAGE_LINES líneas alineados con las secciones"""
+    starts = {(section['page'], section['line']): section['title'] for section in sections}
+    passages = []
+    title = None
+
+    for page_num, text in enumerate(pages, start=1):
+        lines = []
+        for line_num, line in enumerate(text.split('\n')):
+            heading = starts.get((page_num, line_num))
+            if lines and (heading or len(lines) >= PASSAGE_LINES):
+                passages.append({'page': page_num, 'section': title, 'text': '\n'.join(lines)})
+                lines = []
+            if heading:
+                title = heading
+            cleaned = clean_line(line)
+            if cleaned:
+                lines.append(cleaned)
+        if lines:
+            passages.append({'page': page_num, 'section': title, 'text': '\n'.join(lines)})
+
+    return passages
+
+
+def build_index(pages: list[str], sections: list[dict]) -> dict:
+    """Índice invertido BM25: pasajes, longitudes y postings {término: [[pasaje, frecuencia]]}"""
+    passages = build_passages(pages, sections)
+    postings = {}
+    lengths = []
+
+    for doc_id, passage in enumerate(passages):
+        tokens = tokenize(f"{passage['section'] or ''} {passage['text']}")
+        lengths.append(len(tokens))
+        counts = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for token, count in counts.items():
+            postings.setdefault(token, []).append([doc_id, count])
+
+    return {
+        'passages': passages,
+        'lengths': lengths,
+        'avg_length': sum(lengths) / len(lengths) if lengths else 0,
+        'postings': postings,
+    }
+
+
+def get_index(pdf_path: str) -> dict:
+    """Índice del manual, reconstruido solo cuando cambia el PDF"""
+    pages = get_pages(pdf_path)
+    sections = get_sections(pdf_path)
+    return cached(_indexes, pdf_path, "search", lambda: build_index(pages, sections))
+
+
+def search(pdf_path: str, query: str, top_k: int = 5) -> list[dict]:
+    """
+    Pasajes del manual ordenados por relevancia BM25
+
+    Returns:
+        Lista de {score, page, section, text}
+    """
+    index = get_index(pdf_path)
+    total = len(index['passages'])
+    scores = {}
+
+    for term in set(tokenize(query)):
+        postings = index['postings'].get(term)
+        if not postings:
+            continue
+        idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+        for doc_id, freq in postings:
+            norm = 1 - BM25_B + BM25_B * index['lengths'][doc_id] / (index['avg_length'] or 1)
+            scores[doc_id] = scores.get(doc_id, 0) + idf * freq * (BM25_K1 + 1) / (freq + BM25_K1 * norm)
+
+    # Un top_k negativo contaría desde el final del ranking
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:max(top_k, 0)]
+    return [
+        {'score': round(score, 3), **index['passages'][doc_id]}
+        for doc_id, score in ranked
+    ]
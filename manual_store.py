@@ -0,0 +1,255 @@
+"""
+Caché del texto extraído de los manuales PDF
+
+El texto de cada página se extrae una sola vez por versión del fichero
+(ruta + mtime + tamaño): se guarda en memoria y en un fichero JSON junto a
+manuals/ para que los reinicios del servidor tampoco tengan que re-parsear
+el PDF.
+"""
+
+import json
+import os
+import re
+import threading
+import unicodedata
+
+from server_metrics import metrics
+
+MANUALS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'manuals')
+CACHE_DIR = os.path.join(MANUALS_DIR, '.cache')
+
+# Mapeo de versiones
+VERSION_MAP = {
+    "latest": "manual_v3.pdf",
+    "v1": "manual_v1.pdf",
+    "v2": "manual_v2.pdf",
+    "v3": "manual_v3.pdf",
+}
+
+_pages = {}
+_sections = {}
+_lock = threading.RLock()
+
+# Caracteres válidos en una palabra (descarta restos de emojis mal extraídos del PDF)
+WORD_RE = re.compile(r"[\x21-\x7eáéíóúüñÁÉÍÓÚÜÑ¿¡]+")
+
+# Se incrementa cuando cambia el formato o el algoritmo de los ficheros de caché
+CACHE_VERSION = 1
+HEADING_MAX_WORDS = 6
+
+
+def manual_path(version: str) -> str | None:
+    """Ruta del PDF de una versión, o None si la versión no existe"""
+    filename = VERSION_MAP.get(version.lower())
+    if not filename:
+        return None
+    return os.path.join(MANUALS_DIR, filename)
+
+
+def _file_key(pdf_path: str) -> tuple:
+    stat = os.stat(pdf_path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def sidecar_path(pdf_path: str, suffix: str = "pages") -> str:
+    """Fichero de caché en disco asociado a un PDF"""
+    return os.path.join(CACHE_DIR, f"{os.path.basename(pdf_path)}.{suffix}.json")
+
+
+def read_sidecar(pdf_path: str, suffix: str, key: tuple):
+    """Lee un fichero de caché si corresponde a la versión actual del PDF"""
+    try:
+        with open(sidecar_path(pdf_path, suffix), encoding='utf-8') as file:
+            data = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if [data.get('mtime_ns'), data.get('size'), data.get('version')] != [*key, CACHE_VERSION]:
+        return None
+    return data['content']
+
+
+def write_sidecar(pdf_path: str, suffix: str, key: tuple, content):
+    """Guarda un fichero de caché de forma atómica (la caché en disco es opcional)"""
+    path = sidecar_path(pdf_path, suffix)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump({'mtime_ns': key[0], 'size': key[1], 'version': CACHE_VERSION, 'content': content},
+                      file, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+
+def extract_pages(pdf_path: str) -> list[str]:
+    """Extrae el texto de cada página del PDF"""
+    import PyPDF2
+
+    with metrics.timer('pdf.extract'), open(pdf_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        return [page.extract_text() for page in pdf_reader.pages]
+
+
+def cached(memo: dict, pdf_path: str, suffix: str, build):
+    """
+    Valor derivado de un PDF cacheado en memoria y en disco por versión del fichero
+
+    Args:
+        memo: Caché en memoria del tipo de valor
+        pdf_path: Ruta del PDF
+        suffix: Sufijo del fichero de caché en disco
+        build: Función sin argumentos que calcula el valor si no está en caché
+    """
+    key = (pdf_path, *_file_key(pdf_path))
+    value = memo.get(key)
+    if value is not None:
+        return value
+
+    with _lock:
+        value = memo.get(key)
+        if value is None:
+            value = read_sidecar(pdf_path, suffix, key[1:])
+            if value is None:
+                value = build()
+                write_sidecar(pdf_path, suffix, key[1:], value)
+            # Se descartan las entradas de versiones anteriores del mismo fichero
+            for old_key in [k for k in memo if k[0] == pdf_path]:
+                del memo[old_key]
+            memo[key] = value
+
+    return value
+
+
+def get_pages(pdf_path: str) -> list[str]:
+    """
+    Texto de cada página del PDF, desde la caché si el fichero no ha cambiado
+
+    Raises:
+        OSError: Si el PDF no existe o no se puede leer
+    """
+    return cached(_pages, pdf_path, "pages", lambda: extract_pages(pdf_path))
+
+
+# ==================== ÍNDICE DE SECCIONES ====================
+
+def clean_line(line: str) -> str:
+    """
+    Normaliza una línea extraída del PDF
+
+    Quita los bytes nulos que deja el texto UTF-16 de algunos PDF y los restos
+    de emojis.
+    """
+    words = line.replace('\x00', '').split()
+    return ' '.join(word for word in words if WORD_RE.fullmatch(word))
+
+
+def is_heading(line: str) -> bool:
+    """Heurística de encabezado: "Paso N: ..." o una línea corta tipo título"""
+    if re.match(r'Paso \d+:', line):
+        return True
+    if not 3 <= len(line) <= 50 or not line[0].isalpha() or not line[0].isupper():
+        return False
+    if any(char in line for char in ':$"{}•%|=_') or line[-1] in '.,;':
+        return False
+    return len(line.split()) <= HEADING_MAX_WORDS
+
+
+def slugify(text: str) -> str:
+    """Identificador de sección en minúsculas, sin acentos ni espacios"""
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode()
+    return re.sub(r'[^a-z0-9]+', '-', text.lower()).strip('-')
+
+
+def build_sections(pages: list[str]) -> list[dict]:
+    """
+    Índice de encabezados del manual
+
+    Returns:
+        Lista de {slug, title, page, line}; page empieza en 1 y line es la línea
+        del encabezado dentro de la página
+    """
+    sections = []
+    seen = {}
+    for page_num, text in enumerate(pages, start=1):
+        for line_num, line in enumerate(text.split('\n')):
+            # Las viñetas (también las flechas "!’" mal extraídas) y comandos nunca son encabezados
+            if line.lstrip().startswith(('•', '-', '*', '$', '!’')):
+                continue
+            title = clean_line(line)
+            if not title or not is_heading(title):
+                continue
+            slug = slugify(title)
+            seen[slug] = seen.get(slug, 0) + 1
+            if seen[slug] > 1:
+                slug = f"{slug}-{seen[slug]}"
+            sections.append({'slug': slug, 'title': title, 'page': page_num, 'line': line_num})
+    return sections
+
+
+def get_sections(pdf_path: str) -> list[dict]:
+    """Índice de secciones del PDF, cacheado igual que el texto de las páginas"""
+    pages = get_pages(pdf_path)
+    return cached(_sections, pdf_path, "sections", lambda: build_sections(pages))
+
+
+def get_section_text(pdf_path: str, slug: str) -> tuple[dict, str] | None:
+    """
+    Texto de una sección, desde su encabezado hasta el siguiente
+
+    Returns:
+        (sección, texto) o None si el slug no existe
+    """
+    sections = get_sections(pdf_path)
+    index = next((i for i, section in enumerate(sections) if section['slug'] == slug.lower()), None)
+    if index is None:
+        return None
+
+    pages = get_pages(pdf_path)
+    start = sections[index]
+    end = sections[index + 1] if index + 1 < len(sections) else {'page': len(pages), 'line': None}
+
+    lines = []
+    for page_num in range(start['page'], end['page'] + 1):
+        page_lines = pages[page_num - 1].split('\n')
+        first = start['line'] if page_num == start['page'] else 0
+        last = end['line'] if page_num == end['page'] else None
+        lines.extend(page_lines[first:last])
+
+    return start, '\n'.join(lines)
+
+
+def parse_page_range(page_range: str, num_pages: int) -> list[int]:
+    """
+    Convierte un rango de páginas ("2", "1-3", "1,3", "2-") a números de página
+
+    Raises:
+        ValueError: Si el rango no es válido o queda fuera del documento
+    """
+    numbers = []
+    for chunk in page_range.split(','):
+        match = re.fullmatch(r'\s*(\d+)\s*(?:(-)\s*(\d*)\s*)?', chunk)
+        if not match:
+            raise ValueError(f"Rango no válido: {page_range}")
+        start = int(match.group(1))
+        end = int(match.group(3)) if match.group(3) else (num_pages if match.group(2) else start)
+        if start < 1 or end > num_pages or start > end:
+            raise ValueError(f"Páginas fuera de rango (1-{num_pages}): {chunk.strip()}")
+        numbers.extend(n for n in range(start, end + 1) if n not in numbers)
+    return numbers
+
+
+def warm_up():
+    """Precarga el texto y el índice de secciones de todos los manuales"""
+    for filename in sorted(set(VERSION_MAP.values())):
+        try:
+            get_sections(os.path.join(MANUALS_DIR, filename))
+        except Exception:
+            pass
+
+
+def start_warm_up() -> threading.Thread:
+    """Precarga los manuales en segundo plano"""
+    thread = threading.Thread(target=warm_up, name="manual-warm-up", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,583 @@
+"""
+Núcleo común de los clientes MCP (OpenAI y Ollama)
+
+MCPClientCore gestiona la sesión MCP persistente, el catálogo de
+herramientas, la caché de respuestas, la ejecución concurrente de tool calls
+y el ciclo modelo -> herramientas. Lo único que cambia entre proveedores es
+el LLMBackend: cómo se llama al modelo y cómo se escriben los mensajes de
+herramientas en su formato.
+"""
+
+from dotenv import load_dotenv
+
+# La configuración de los módulos del cliente se lee de .env al importarlos
+load_dotenv()
+
+from abc import ABC, abstractmethod
+from fastmcp import Client
+from fastmcp.exceptions import ToolError
+from mcp.shared.exceptions import McpError
+from context_budget import fit_messages
+from response_cache import MUTATING_TOOLS, ResponseCache, make_key, ttl_for
+from tool_arguments import InvalidArguments, decode_arguments, loads
+from turn_trace import TurnTrace, annotate, trace_span, use_trace
+import anyio
+import ast
+import asyncio
+import json
+import mcp.types
+import os
+import re
+import time
+
+# Segundos que se reutiliza el catálogo de herramientas y recursos del servidor
+CATALOG_TTL = int(os.getenv("MCP_CATALOG_TTL", "300"))
+
+# Máximo de tool calls de un mismo turno que se ejecutan a la vez
+TOOL_CONCURRENCY = int(os.getenv("MCP_TOOL_CONCURRENCY", "4"))
+
+# Rondas máximas de herramientas por turno; la siguiente llamada al modelo ya no ofrece herramientas
+MAX_TOOL_STEPS = int(os.getenv("MCP_MAX_TOOL_STEPS", "8"))
+
+# Notificaciones del servidor que invalidan el catálogo
+LIST_CHANGED_NOTIFICATIONS = (
+    mcp.types.ToolListChangedNotification,
+    mcp.types.ResourceListChangedNotification,
+    mcp.types.PromptListChangedNotification,
+)
+
+# Errores de una sesión MCP muerta (p. ej. el subproceso del servidor terminó): la
+# petición no llegó a enviarse, así que se puede repetir con una conexión nueva
+CLOSED_CONNECTION_ERRORS = (anyio.ClosedResourceError, anyio.BrokenResourceError, anyio.EndOfStream)
+
+
+class LLMBackend(ABC):
+    """Proveedor de LLM enchufable en MCPClientCore (un backend incompleto falla al instanciarlo)"""
+
+    def __init__(self, model: str):
+        self.model = model
+
+        # Cliente HTTP del LLM, reutilizado (keep-alive) dentro de cada event loop
+        self._client = None
+        self._loop = None
+
+    @abstractmethod
+    def _create_client(self):
+        """Crea el cliente HTTP asíncrono del proveedor"""
+
+    def client(self):
+        """Cliente del event loop actual (su pool de conexiones no sirve en otro loop)"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._client = self._create_client()
+            self._loop = loop
+        return self._client
+
+    async def close(self):
+        """Cierra las conexiones con el LLM"""
+        if self._client is not None and self._loop is asyncio.get_running_loop():
+            await self._client.close()
+        self._client = None
+        self._loop = None
+
+    @abstractmethod
+    def stream(self, messages: list, tools: list | None, usage: dict | None = None):
+        """
+        Llama al modelo en streaming (generador asíncrono)
+
+        Genera el texto de la respuesta (str) a medida que llega y, al final,
+        cada tool call como {id, name, arguments} con los argumentos tal como
+        los entrega el proveedor (se decodifican en run_tool_calls).
+
+        Si se pasa `usage`, se rellena con prompt_tokens y completion_tokens.
+        """
+
+    @abstractmethod
+    def assistant_message(self, content: str, tool_calls: list) -> dict:
+        """Mensaje del asistente que pide las tool calls, en el formato del proveedor"""
+
+    @abstractmethod
+    def tool_message(self, tool_call: dict, response: str) -> dict:
+        """Mensaje con el resultado de una tool call, en el formato del proveedor"""
+
+
+class MCPClientCore:
+    """Cliente MCP independiente del proveedor de LLM"""
+
+    def __init__(self, backend: LLMBackend, mcp_server_path):
+        self.backend = backend
+        self.mcp_server_path = mcp_server_path
+
+        # Sesión MCP persistente (un único subproceso del servidor por event loop)
+        self._mcp_client = None
+        self._mcp_loop = None
+        self._mcp_lock = None
+
+        # Catálogo de herramientas y recursos ya convertido (ver get_catalog)
+        self._catalog = None
+        self._catalog_expires = 0
+        self._catalog_generation = 0
+
+        # Respuestas de herramientas y recursos idempotentes
+        self.cache = ResponseCache()
+
+        # Traza del último turno de chat (ver turn_trace.py)
+        self.last_trace = None
+
+    async def _get_mcp_client(self):
+        """
+        Devuelve la conexión persistente con el servidor MCP, abriéndola o
+        reconectando si hace falta.
+
+        La conexión queda abierta entre llamadas: los `async with` de los métodos
+        solo anidan sobre ella y no la cierran.
+        """
+        loop = asyncio.get_running_loop()
+        if self._mcp_loop is not loop:
+            # La sesión queda ligada al event loop que la creó; con otro loop hay que abrir una nueva
+            self._mcp_client = None
+            self._mcp_loop = loop
+            self._mcp_lock = asyncio.Lock()
+
+        async with self._mcp_lock:
+            if self._mcp_client is None or not self._mcp_client.is_connected():
+                # Con stdio incluye el arranque del subproceso del servidor
+                with trace_span("connect", str(self.mcp_server_path)):
+                    cliente = Client(self.mcp_server_path, message_handler=self._on_mcp_message)
+                    await cliente.__aenter__()
+                self._mcp_client = cliente
+
+        return self._mcp_client
+
+    async def _drop_mcp_client(self, cliente):
+        """Descarta una conexión muerta; la siguiente petición abre otra"""
+        async with self._mcp_lock:
+            if self._mcp_client is not cliente:
+                # Otra petición concurrente ya la descartó
+                return
+            self._mcp_client = None
+        try:
+            await cliente.close()
+        except Exception:
+            pass
+
+    async def _request(self, cliente, method, idempotent: bool = True):
+        """
+        Ejecuta method(cliente); si la sesión MCP está muerta, reconecta y lo repite una vez
+
+        is_connected() sigue siendo True cuando el subproceso del servidor muere,
+        así que la conexión caída solo se detecta al usarla.
+
+        Args:
+            cliente: Sesión MCP con la que se hizo la petición
+            method: Función async cliente -> resultado
+            idempotent: Si la conexión se cerró con la petición ya enviada, repetirla
+        """
+        try:
+            return await method(cliente)
+        except CLOSED_CONNECTION_ERRORS:
+            pass
+        except McpError as e:
+            if e.error.code != mcp.types.CONNECTION_CLOSED:
+                raise
+            if not idempotent:
+                # El servidor pudo ejecutarla antes de morir: no se repite (p. ej. un envío)
+                await self._drop_mcp_client(cliente)
+                raise
+
+        await self._drop_mcp_client(cliente)
+        return await method(await self._get_mcp_client())
+
+    async def close(self):
+        """Cierra la sesión MCP persistente y las conexiones con el LLM"""
+        if self._mcp_client is not None and self._mcp_loop is asyncio.get_running_loop():
+            await self._mcp_client.__aexit__(None, None, None)
+        self._mcp_client = None
+        await self.backend.close()
+
+    # ==================== CATÁLOGO ====================
+
+    def invalidate_catalog(self):
+        """Descarta el catálogo cacheado; se volverá a pedir al servidor"""
+        self._catalog = None
+        self._catalog_generation += 1
+
+    async def _on_mcp_message(self, message):
+        """Invalida el catálogo cuando el servidor notifica cambios en sus listas"""
+        if isinstance(message, mcp.types.ServerNotification) and isinstance(message.root, LIST_CHANGED_NOTIFICATIONS):
+            self.invalidate_catalog()
+
+    async def get_catalog(self) -> dict:
+        """
+        Catálogo del servidor ya convertido a function calling
+
+        Se reutiliza hasta que el servidor notifica un cambio (list_changed) o
+        vence MCP_CATALOG_TTL, así un turno de chat no hace peticiones de listado.
+
+        Returns:
+            {info, tools, resource_tools, resource_map, schemas, defaults}
+        """
+        if self._catalog is not None and time.monotonic() < self._catalog_expires:
+            return self._catalog
+
+        generation = self._catalog_generation
+        with trace_span("catalog", "list"):
+            async def list_all(cliente):
+                return (
+                    await cliente.list_tools(),
+                    await cliente.list_resources(),
+                    await cliente.list_resource_templates(),
+                    await cliente.list_prompts(),
+                )
+
+            async with await self._get_mcp_client() as cliente:
+                tools, resources, templates, prompts = await self._request(cliente, list_all)
+
+        resource_tools, resource_map = self._resources_to_tools(resources, templates)
+        catalog = {
+            "info": {
+                "tools": [t.name for t in tools],
+                "resources": [r.name for r in resources],
+                "templates": [t.name for t in templates],
+                "prompts": [p.name for p in prompts],
+                "server": self.mcp_server_path
+            },
+            "tools": self._tools_to_functions(tools),
+            "resource_tools": resource_tools,
+            "resource_map": resource_map,
+            # Esquemas de argumentos de cada herramienta (también los recursos), para validar las tool calls
+            "schemas": {
+                function["function"]["name"]: function["function"]["parameters"]
+                for function in self._tools_to_functions(tools) + resource_tools
+            },
+            # Valores por defecto de cada herramienta, para normalizar las claves de la caché
+            "defaults": {
+                tool.name: {name: prop["default"] for name, prop in (tool.inputSchema.get("properties") or {}).items()
+                            if "default" in prop}
+                for tool in tools
+            }
+        }
+
+        # Si llegó una notificación mientras se listaba, el resultado puede estar desfasado
+        if generation == self._catalog_generation:
+            self._catalog = catalog
+            self._catalog_expires = time.monotonic() + CATALOG_TTL
+        return catalog
+
+    async def get_system_info(self) -> dict:
+        """Información del sistema MCP"""
+        return (await self.get_catalog())["info"]
+
+    async def get_tools_for_llm(self):
+        """Herramientas MCP en formato function calling"""
+        catalog = await self.get_catalog()
+        return catalog["tools"], await self._get_mcp_client()
+
+    async def get_resources_as_tools(self):
+        """Encapsula recursos y templates como herramientas."""
+        catalog = await self.get_catalog()
+        return catalog["resource_tools"], catalog["resource_map"]
+
+    @staticmethod
+    def _tools_to_functions(tools) -> list:
+        """Convierte las herramientas MCP al formato function calling"""
+        return [
+            {
+                "type": "function",
+                "function": {
+                    "name": tool.name,
+                    "description": tool.description or "",
+                    "parameters": tool.inputSchema
+                }
+            }
+            for tool in tools
+        ]
+
+    @staticmethod
+    def _resources_to_tools(resources, templates):
+        """Convierte recursos y templates en herramientas y su mapa nombre -> URI"""
+        resource_tools = []
+        resource_map = {}
+
+        # 1. Recursos estáticos
+        for resource in resources:
+            uri = str(resource.uri)
+            func_name = f"get_resource_{uri.replace('://', '_').replace('/', '_')}"
+
+            resource_tools.append({
+                "type": "function",
+                "function": {
+                    "name": func_name,
+                    "description": resource.description or resource.name,
+                    "parameters": {"type": "object", "properties": {}, "required": []}
+                }
+            })
+
+            resource_map[func_name] = {"uri": uri}
+
+        # 2. Resource templates
+        for template in templates:
+            uri_template = str(template.uriTemplate)
+            func_name = template.name
+
+            # Extraer parametros del template
+            params = re.findall(r'\{(\w+)\}', uri_template)
+
+            properties = {p: {"type": "string", "description": f"Parametro {p}"} for p in params}
+
+            resource_tools.append({
+                "type": "function",
+                "function": {
+                    "name": func_name,
+                    "description": template.description or template.name,
+                    "parameters": {
+                        "type": "object",
+                        "properties": properties,
+                        "required": params
+                    }
+                }
+            })
+
+            resource_map[func_name] = {"template": uri_template, "params": params}
+
+        return resource_tools, resource_map
+
+    # ==================== PROMPTS, HERRAMIENTAS Y RECURSOS ====================
+
+    async def get_prompt_messages(self, prompt_name: str, **kwargs) -> dict:
+        """
+        Obtiene el mensaje de un prompt especifico.
+
+        Returns:
+            {"role", "content": {"type", "text"}}
+        """
+        async with await self._get_mcp_client() as cliente:
+            prompt = await self._request(cliente, lambda c: c.get_prompt(prompt_name, arguments=kwargs))
+
+        message = prompt.messages[0]
+        text = message.content.text
+        # Servidores antiguos devuelven el mensaje serializado dentro del texto
+        if text.lstrip().startswith(("{", "[")):
+            try:
+                decoded = loads(text)
+            except ValueError:
+                try:
+                    decoded = ast.literal_eval(text)
+                except (ValueError, SyntaxError):
+                    decoded = None
+            if isinstance(decoded, list) and decoded:
+                decoded = decoded[0]
+            if isinstance(decoded, dict) and isinstance(decoded.get("content"), dict):
+                return decoded
+
+        return {"role": message.role, "content": {"type": "text", "text": text}}
+
+    async def call_tool(self, tool_name: str, arguments: dict, client):
+        """Ejecuta una herramienta MCP (las idempotentes se sirven desde la caché si es posible)"""
+        ttl = ttl_for(tool_name)
+        if ttl:
+            defaults = (self._catalog or {}).get("defaults", {}).get(tool_name)
+            key = make_key(tool_name, arguments, defaults)
+            cached = self.cache.get(key)
+            if cached is not None:
+                annotate(cached=True)
+                return cached
+
+        try:
+            result = await self._request(
+                client, lambda c: c.call_tool(tool_name, arguments), idempotent=tool_name not in MUTATING_TOOLS
+            )
+        finally:
+            # Aunque falle, un envío puede haber modificado el buzón
+            if tool_name in MUTATING_TOOLS:
+                self.cache.invalidate(MUTATING_TOOLS[tool_name])
+
+        response = "Herramienta ejecutada sin resultados"
+        # Verificar la estructura de la respuesta
+        if result and result.content and len(result.content) > 0:
+            if hasattr(result.content[0], 'text'):
+                response = result.content[0].text
+
+        if ttl:
+            self.cache.put(key, response, ttl)
+        return response
+
+    async def stream_emails(self, query: str = "", max_results: int = 100, page_token: str = ""):
+        """Genera los emails por lotes a medida que el servidor los envía (tool stream_emails)"""
+        queue = asyncio.Queue()
+
+        async def on_progress(progress, total, message):
+            # Cada notificación de progreso trae un lote de emails en JSON
+            if message:
+                await queue.put(json.loads(message))
+
+        # Con la sesión muerta se reconecta y se repite, si aún no se había entregado ningún lote
+        for attempt in range(2):
+            yielded = False
+            async with await self._get_mcp_client() as cliente:
+                task = asyncio.create_task(cliente.call_tool(
+                    "stream_emails",
+                    {"max_results": max_results, "query": query, "page_token": page_token},
+                    progress_handler=on_progress
+                ))
+
+                while not (task.done() and queue.empty()):
+                    getter = asyncio.create_task(queue.get())
+                    done, _ = await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+                    if getter in done:
+                        yielded = True
+                        yield getter.result()
+                    else:
+                        getter.cancel()
+
+                # Propaga errores de la tool
+                try:
+                    await task
+                    return
+                except CLOSED_CONNECTION_ERRORS:
+                    await self._drop_mcp_client(cliente)
+                    if yielded or attempt:
+                        raise
+
+    async def get_resource(self, uri: str, client):
+        """Obtiene un recurso MCP (desde la caché si su URI tiene TTL)"""
+        ttl = ttl_for(uri)
+        key = make_key(uri)
+        if ttl:
+            cached = self.cache.get(key)
+            if cached is not None:
+                annotate(cached=True)
+                return cached
+
+        result = await self._request(client, lambda c: c.read_resource(uri))
+        response = "Recurso no disponible"
+        # Verificar estructura de la respuesta
+        if result and len(result) > 0:
+            if hasattr(result[0], 'text'):
+                response = result[0].text
+            elif hasattr(result[0], 'content'):
+                response = result[0].content
+
+        if ttl:
+            self.cache.put(key, response, ttl)
+        return response
+
+    async def run_tool_calls(self, calls: list, resource_map: dict, client) -> list:
+        """
+        Ejecuta en paralelo las tool calls de un turno (como mucho TOOL_CONCURRENCY a la vez)
+
+        Args:
+            calls: Lista de (nombre, argumentos en JSON o ya decodificados)
+            resource_map: Mapa de herramientas que son recursos MCP
+            client: Sesión MCP abierta
+
+        Returns:
+            Las respuestas en el mismo orden que las llamadas
+        """
+        semaphore = asyncio.Semaphore(TOOL_CONCURRENCY)
+        schemas = (self._catalog or {}).get("schemas", {})
+
+        async def run(function_name, function_args):
+            kind = "resource" if function_name in resource_map else "tool"
+            with trace_span(kind, function_name):
+                return await run_call(function_name, function_args)
+
+        async def run_call(function_name, function_args):
+            try:
+                function_args = decode_arguments(function_args, schemas.get(function_name))
+            except InvalidArguments as e:
+                annotate(error="InvalidArguments")
+                # El modelo recibe el error como resultado y puede corregir la llamada
+                return f"Error: argumentos no válidos para {function_name}: {e}"
+
+            try:
+                async with semaphore:
+                    # Verficar si es un recurso
+                    if function_name in resource_map:
+                        resource_info = resource_map[function_name]
+
+                        if "template" in resource_info:
+                            # Resource template: construir URI
+                            uri = resource_info["template"]
+                            for param in resource_info["params"]:
+                                uri = uri.replace(f"{{{param}}}", str(function_args.get(param, "")))
+                        else:
+                            # Recurso estatico
+                            uri = resource_info['uri']
+
+                        return await self.get_resource(uri, client)
+
+                    # Herramienta normal
+                    return await self.call_tool(function_name, function_args, client)
+            except (ToolError, McpError) as e:
+                annotate(error=type(e).__name__)
+                # Un fallo no aborta el turno: el resto de llamadas sigue y el modelo ve el error
+                return f"Error al ejecutar {function_name}: {e}"
+
+        return await asyncio.gather(*(run(name, args) for name, args in calls))
+
+    # ==================== CHAT ====================
+
+    async def chat_completion_stream(self, messages: list, trace: TurnTrace | None = None):
+        """
+        Procesa una conversación utilizando MCP, generando el texto a medida que llega
+
+        Repite el ciclo modelo -> herramientas hasta que el modelo responde sin
+        tool calls o se agotan MAX_TOOL_STEPS rondas. El desglose de tiempos del
+        turno queda en `trace` (o en una TurnTrace nueva) y en self.last_trace.
+        """
+        trace = trace or TurnTrace(self.backend.model)
+        self.last_trace = trace
+
+        try:
+            # La traza se fija solo alrededor de los await sin yield: cada paso del
+            # generador puede ejecutarse en una tarea (y un contexto) distinta
+            with use_trace(trace):
+                cliente = await self._get_mcp_client()
+                # Obtener herramientas y recursos
+                tools, _ = await self.get_tools_for_llm()
+                resource_tools, resource_map = await self.get_resources_as_tools()
+            all_tools = tools + resource_tools
+
+            async with cliente:
+                for step in range(MAX_TOOL_STEPS + 1):
+                    # Agotado el presupuesto, se pide la respuesta final sin herramientas
+                    step_tools = all_tools if step < MAX_TOOL_STEPS else None
+                    # Solo se envía lo que cabe en el contexto: resultados recortados y sin turnos viejos
+                    prompt = fit_messages(messages, self.backend.model, step_tools)
+
+                    content = ""
+                    tool_calls = []
+                    with trace.span("llm", self.backend.model, step=step) as span:
+                        async for item in self.backend.stream(prompt, step_tools, usage=span):
+                            if "ttft_ms" not in span:
+                                span["ttft_ms"] = round(trace.elapsed_ms() - span["start_ms"], 1)
+                            if isinstance(item, str):
+                                content += item
+                                yield item
+                            else:
+                                tool_calls.append(item)
+                        span["tool_calls"] = len(tool_calls)
+
+                    # Si no hay tool calls, la respuesta está completa
+                    if not tool_calls:
+                        return
+                    if content:
+                        yield "\n\n"
+
+                    # Procesar tool calls
+                    messages.append(self.backend.assistant_message(content, tool_calls))
+
+                    # Las tool calls son independientes: se ejecutan a la vez
+                    calls = [(tc["name"], tc["arguments"]) for tc in tool_calls]
+                    with use_trace(trace), trace_span("tools", f"ronda {step + 1}", calls=len(calls)):
+                        responses = await self.run_tool_calls(calls, resource_map, cliente)
+
+                    for tool_call, function_response in zip(tool_calls, responses):
+                        messages.append(self.backend.tool_message(tool_call, function_response))
+        finally:
+            trace.finish()
+
+    async def chat_completion(self, messages: list, trace: TurnTrace | None = None) -> str:
+        """Procesa una conversación utilizando MCP (el desglose de tiempos queda en self.last_trace)"""
+        return "".join([chunk async for chunk in self.chat_completion_stream(messages, trace)])
@@ -0,0 +1,103 @@
+"""
+Caché de respuestas de herramientas y recursos MCP idempotentes
+
+Las respuestas se guardan por (herramienta o URI, argumentos normalizados)
+con un TTL por herramienta y expulsión LRU. Las herramientas que modifican el
+buzón no se cachean e invalidan las entradas que dependen de él.
+"""
+
+from collections import OrderedDict
+import json
+import os
+import threading
+import time
+
+# TTL en segundos por herramienta o prefijo de URI; lo que no aparece aquí no se cachea
+CACHE_TTLS = {
+    "list_emails": 60,
+    "list_emails_page": 60,
+    "get_email": 600,
+    "get_thread": 120,
+    "search_manual": 3600,
+    "gmail://profile": 300,
+    "gmail://inbox-summary": 60,
+    "gmail://email/": 600,
+    "docs://setup-manual/": 3600,
+}
+
+# Herramientas que modifican el buzón y entradas (nombre o prefijo) que dejan obsoletas
+MUTATING_TOOLS = {
+    "send_email": ("list_emails", "get_thread", "gmail://profile", "gmail://inbox-summary"),
+    "send_emails_bulk": ("list_emails", "get_thread", "gmail://profile", "gmail://inbox-summary"),
+}
+
+MAX_ENTRIES = int(os.getenv("MCP_CACHE_MAX_ENTRIES", "256"))
+
+
+def ttl_for(name: str) -> int:
+    """TTL de una herramienta o URI (0 si no se cachea)"""
+    if name in CACHE_TTLS:
+        return CACHE_TTLS[name]
+    return next((ttl for prefix, ttl in CACHE_TTLS.items() if prefix.endswith('/') and name.startswith(prefix)), 0)
+
+
+def make_key(name: str, arguments: dict | None = None, defaults: dict | None = None) -> tuple:
+    """Clave de caché: los argumentos omitidos toman su valor por defecto y el orden no importa"""
+    arguments = {**(defaults or {}), **(arguments or {})}
+    normalized = {k: v.strip() if isinstance(v, str) else v for k, v in arguments.items()}
+    return name, json.dumps(normalized, sort_keys=True, ensure_ascii=False, default=str)
+
+
+class ResponseCache:
+    """Caché LRU con TTL por entrada y contadores de aciertos"""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key: tuple):
+        """Respuesta cacheada o None si no existe o ha caducado"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: tuple, value, ttl: int):
+        """Guarda una respuesta; se expulsa la menos usada si se supera max_entries"""
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, prefixes=None):
+        """Descarta las entradas cuyo nombre empieza por alguno de los prefijos (todas si es None)"""
+        with self._lock:
+            stale = [key for key in self._entries if prefixes is None or key[0].startswith(tuple(prefixes))]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+
+    def stats(self) -> dict:
+        """Contadores para ajustar los TTL"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "entries": len(self._entries),
+                "invalidations": self.invalidations
+            }
@@ -0,0 +1,216 @@
+"""
+Métricas del servidor MCP: latencia por herramienta y cuota de Gmail consumida
+
+Cada llamada a una herramienta o recurso fija la herramienta en curso en un
+ContextVar. Los temporizadores (carga del token, construcción del servicio,
+peticiones a la API, extracción de PDFs) y las unidades de cuota se acumulan
+bajo esa herramienta, así que un list_emails lento se puede repartir entre
+auth, messages.list y el batch de messages.get.
+
+Si opentelemetry está instalado, cada temporizador abre además un span.
+"""
+
+from fastmcp.server.middleware import Middleware, MiddlewareContext
+from urllib.parse import urlsplit
+import contextlib
+import contextvars
+import threading
+import time
+
+try:
+    from opentelemetry import trace
+except ImportError:
+    trace = None
+
+# Límites (segundos) de los buckets del histograma de Prometheus
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Trabajo fuera de una llamada MCP (refresco del token, precarga de manuales)
+BACKGROUND = "background"
+
+current_tool = contextvars.ContextVar("current_tool", default=BACKGROUND)
+
+_tracer = trace.get_tracer("gmail_mcp_server") if trace is not None else None
+
+
+class Histogram:
+    """Recuento, suma, máximo y buckets acumulables de una operación"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * len(BUCKETS)
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "total_ms": round(self.total * 1000, 2),
+            "avg_ms": round(self.total * 1000 / self.count, 2) if self.count else 0,
+            "max_ms": round(self.max * 1000, 2),
+        }
+
+
+class ServerMetrics:
+    """Agregados del proceso, seguros entre hilos"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._timers = {}
+        self._quota = {}
+        self.started = time.time()
+
+    # ==================== REGISTRO ====================
+
+    @contextlib.contextmanager
+    def tool_call(self, name: str):
+        """Atribuye a `name` todo lo que ocurra dentro del bloque (y de las tareas que copien su contexto)"""
+        token = current_tool.set(name)
+        failed = False
+        try:
+            with self.timer("total"):
+                yield
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            current_tool.reset(token)
+            with self._lock:
+                calls = self._calls.setdefault(name, {"calls": 0, "errors": 0})
+                calls["calls"] += 1
+                calls["errors"] += failed
+
+    @contextlib.contextmanager
+    def timer(self, operation: str):
+        """Mide el bloque como `operation` de la herramienta en curso"""
+        tool = current_tool.get()
+        span = (_tracer.start_as_current_span(operation, attributes={"mcp.tool": tool})
+                if _tracer is not None else contextlib.nullcontext())
+        start = time.perf_counter()
+        try:
+            with span:
+                yield
+        finally:
+            self.observe(operation, time.perf_counter() - start, tool)
+
+    def observe(self, operation: str, seconds: float, tool: str | None = None):
+        key = (tool or current_tool.get(), operation)
+        with self._lock:
+            histogram = self._timers.get(key)
+            if histogram is None:
+                histogram = self._timers[key] = Histogram()
+            histogram.observe(seconds)
+
+    def add_quota(self, method: str, units: int, tool: str | None = None):
+        """Suma unidades de cuota de Gmail de `method` a la herramienta en curso"""
+        key = (tool or current_tool.get(), method)
+        with self._lock:
+            self._quota[key] = self._quota.get(key, 0) + units
+
+    def reset(self):
+        with self._lock:
+            self._calls.clear()
+            self._timers.clear()
+            self._quota.clear()
+            self.started = time.time()
+
+    # ==================== EXPORTACIÓN ====================
+
+    def snapshot(self) -> dict:
+        """{tool: {calls, errors, quota_units, quota, operations}}"""
+        with self._lock:
+            tools = {}
+
+            def entry(tool):
+                return tools.setdefault(tool, {
+                    "calls": 0, "errors": 0, "quota_units": 0, "quota": {}, "operations": {}
+                })
+
+            for tool, calls in self._calls.items():
+                entry(tool).update(calls)
+            for (tool, operation), histogram in sorted(self._timers.items()):
+                entry(tool)["operations"][operation] = histogram.snapshot()
+            for (tool, method), units in sorted(self._quota.items()):
+                data = entry(tool)
+                data["quota"][method] = units
+                data["quota_units"] += units
+
+            return {"uptime_s": round(time.time() - self.started, 1), "tools": tools}
+
+    def prometheus(self) -> str:
+        """Formato de texto de Prometheus"""
+        lines = []
+        with self._lock:
+            lines += [
+                "# HELP mcp_tool_calls_total Llamadas MCP por herramienta o recurso",
+                "# TYPE mcp_tool_calls_total counter",
+            ]
+            lines += [f'mcp_tool_calls_total{{tool="{_escape(tool)}"}} {calls["calls"]}'
+                      for tool, calls in sorted(self._calls.items())]
+            lines += [
+                "# HELP mcp_tool_errors_total Llamadas MCP que terminaron en error",
+                "# TYPE mcp_tool_errors_total counter",
+            ]
+            lines += [f'mcp_tool_errors_total{{tool="{_escape(tool)}"}} {calls["errors"]}'
+                      for tool, calls in sorted(self._calls.items())]
+
+            lines += [
+                "# HELP mcp_operation_seconds Duración de cada operación dentro de una herramienta",
+                "# TYPE mcp_operation_seconds histogram",
+            ]
+            for (tool, operation), histogram in sorted(self._timers.items()):
+                labels = f'tool="{_escape(tool)}",operation="{_escape(operation)}"'
+                cumulative = 0
+                for bound, count in zip(BUCKETS, histogram.buckets):
+                    cumulative += count
+                    lines.append(f'mcp_operation_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'mcp_operation_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f"mcp_operation_seconds_sum{{{labels}}} {histogram.total:.6f}")
+                lines.append(f"mcp_operation_seconds_count{{{labels}}} {histogram.count}")
+
+            lines += [
+                "# HELP gmail_quota_units_total Unidades de cuota de Gmail consumidas",
+                "# TYPE gmail_quota_units_total counter",
+            ]
+            lines += [f'gmail_quota_units_total{{tool="{_escape(tool)}",method="{_escape(method)}"}} {units}'
+                      for (tool, method), units in sorted(self._quota.items())]
+
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def resource_label(uri) -> str:
+    """Etiqueta de un recurso sin sus parámetros (gmail://email/123 -> gmail://email)"""
+    parts = urlsplit(str(uri))
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+class MetricsMiddleware(Middleware):
+    """Envuelve cada tool call y lectura de recurso en metrics.tool_call"""
+
+    def __init__(self, server_metrics: ServerMetrics):
+        self.metrics = server_metrics
+
+    async def on_call_tool(self, context: MiddlewareContext, call_next):
+        with self.metrics.tool_call(context.message.name):
+            return await call_next(context)
+
+    async def on_read_resource(self, context: MiddlewareContext, call_next):
+        with self.metrics.tool_call(resource_label(context.message.uri)):
+            return await call_next(context)
+
+
+metrics = ServerMetrics()
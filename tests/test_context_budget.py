@@ -0,0 +1,125 @@
+"""
+Ajuste de los mensajes al presupuesto de tokens del modelo
+"""
+
+import copy
+
+import pytest
+
+import context_budget
+from context_budget import (
+    CHARS_PER_TOKEN, OLD_TOOL_RESULT_TOKENS, RESPONSE_RESERVE, TOOL_RESULT_TOKENS,
+    estimate_tokens, fit_messages, message_tokens, truncate_text,
+)
+
+
+def tool_result(tokens: int) -> dict:
+    return {"role": "tool", "tool_call_id": "1", "content": "x" * tokens * CHARS_PER_TOKEN}
+
+
+def conversation(turns: int, result_tokens: int = 10) -> list:
+    """Sistema y `turns` turnos de usuario -> tool call -> resultado -> respuesta"""
+    messages = [{"role": "system", "content": "Eres un asistente"}]
+    for turn in range(turns):
+        messages += [
+            {"role": "user", "content": f"pregunta {turn}"},
+            {"role": "assistant", "content": "", "tool_calls": [{"id": "1", "name": "list_emails"}]},
+            tool_result(result_tokens),
+            {"role": "assistant", "content": f"respuesta {turn}"},
+        ]
+    return messages
+
+
+@pytest.fixture
+def context(monkeypatch):
+    """Fija los tokens de contexto disponibles para el prompt (sin la reserva de respuesta)"""
+    def set_budget(tokens: int):
+        monkeypatch.setenv("LLM_CONTEXT_TOKENS", str(tokens + RESPONSE_RESERVE))
+    return set_budget
+
+
+def total_tokens(messages: list) -> int:
+    return sum(message_tokens(message) for message in messages)
+
+
+def test_estimate_tokens():
+    assert estimate_tokens(None) == 0
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcd") == 1
+    assert estimate_tokens("abcde") == 2
+    assert estimate_tokens({"a": 1}) == estimate_tokens('{"a": 1}')
+
+
+def test_context_tokens_per_model(monkeypatch):
+    monkeypatch.delenv("LLM_CONTEXT_TOKENS", raising=False)
+    assert context_budget.context_tokens("gpt-4o-mini") == 32000
+    assert context_budget.context_tokens("desconocido") == context_budget.DEFAULT_CONTEXT_TOKENS
+    monkeypatch.setenv("LLM_CONTEXT_TOKENS", "1234")
+    assert context_budget.context_tokens("gpt-4o-mini") == 1234
+
+
+def test_truncate_text_keeps_the_beginning():
+    text = "a" * 10 + "b" * 100
+    truncated = truncate_text(text, 5)
+    assert truncated.startswith("a" * 10 + "b" * 10)
+    assert "recortado: 90 caracteres omitidos" in truncated
+    assert truncate_text("corto", 5) == "corto"
+
+
+def test_small_conversation_is_unchanged(context):
+    context(10_000)
+    messages = conversation(2)
+    assert fit_messages(messages, "modelo") == messages
+
+
+def test_history_is_not_modified(context):
+    context(200)
+    messages = conversation(5, result_tokens=OLD_TOOL_RESULT_TOKENS * 3)
+    original = copy.deepcopy(messages)
+    fit_messages(messages, "modelo")
+    assert messages == original
+
+
+def test_tool_results_are_truncated_more_in_old_turns(context):
+    context(100_000)
+    messages = conversation(2, result_tokens=TOOL_RESULT_TOKENS * 2)
+    fitted = fit_messages(messages, "modelo")
+
+    old, current = fitted[3]["content"], fitted[7]["content"]
+    assert old.startswith("x" * OLD_TOOL_RESULT_TOKENS * CHARS_PER_TOKEN + "\n[... recortado")
+    assert current.startswith("x" * TOOL_RESULT_TOKENS * CHARS_PER_TOKEN + "\n[... recortado")
+
+
+def test_oldest_turns_are_dropped_whole(context):
+    messages = conversation(6)
+    # Caben el sistema y dos turnos de cuatro mensajes
+    context(total_tokens(conversation(2)) + 1)
+
+    fitted = fit_messages(messages, "modelo")
+
+    # Se conservan el sistema y los turnos más recientes completos (cada tool call con su resultado)
+    assert fitted[0]["role"] == "system"
+    assert [m["content"] for m in fitted[1:]] == [m["content"] for m in messages[-8:]]
+    assert fitted[1]["role"] == "user"
+    assert total_tokens(fitted) <= total_tokens(conversation(2)) + 1
+
+
+def test_tool_schemas_count_against_the_budget(context):
+    messages = conversation(3)
+    context(total_tokens(messages))
+    assert fit_messages(messages, "modelo") == messages
+
+    tools = [{"type": "function", "function": {"name": "x", "description": "d" * 200}}]
+    assert len(fit_messages(messages, "modelo", tools)) < len(messages)
+
+
+def test_current_turn_results_are_halved_as_a_last_resort(context):
+    messages = conversation(1, result_tokens=TOOL_RESULT_TOKENS)
+    context(TOOL_RESULT_TOKENS // 2)
+
+    fitted = fit_messages(messages, "modelo")
+
+    # El turno actual nunca se descarta: se reducen sus resultados
+    assert [m["role"] for m in fitted] == [m["role"] for m in messages]
+    assert estimate_tokens(fitted[3]["content"]) < TOOL_RESULT_TOKENS // 2
+    assert total_tokens(fitted) <= TOOL_RESULT_TOKENS // 2
@@ -0,0 +1,91 @@
+"""
+Herramientas del servidor MCP de extremo a extremo contra la API falsa de benchmarks/fake_gmail.py
+"""
+
+from pathlib import Path
+import asyncio
+import itertools
+import sys
+
+import pytest
+
+pytest.importorskip('fastmcp')
+pytest.importorskip('googleapiclient')
+pytest.importorskip('google_auth_httplib2')
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'benchmarks'))
+
+from fastmcp import Client  # noqa: E402
+from fake_gmail import start_fake_gmail  # noqa: E402
+import gmail_mcp_server  # noqa: E402
+import gmail_session  # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def fake():
+    server = start_fake_gmail(200)
+    session = gmail_session.GmailSession(api_endpoint=server.endpoint)
+    # Sin pausas por cuota: el buzón falso no la limita
+    session.quota = gmail_session.QuotaLimiter(100_000)
+    previous, gmail_session._session = gmail_session._session, session
+    yield server
+    gmail_session._session = previous
+    session.close()
+    server.shutdown()
+
+
+@pytest.fixture
+def server(fake, monkeypatch):
+    """Servidor sin espejo local: todas las llamadas van a la API falsa"""
+    monkeypatch.setattr(gmail_mcp_server, 'MIRROR_PATH', '')
+    monkeypatch.setattr(gmail_mcp_server, '_mirror', None)
+    return fake
+
+
+def call(tool: str, arguments: dict):
+    async def run():
+        async with Client(gmail_mcp_server.mcp) as client:
+            return await client.call_tool(tool, arguments, raise_on_error=False)
+    return asyncio.run(run())
+
+
+def test_list_and_get_email(server):
+    result = call('list_emails', {'max_results': 5})
+    emails = result.structured_content['result']
+    assert [email['id'] for email in emails] == list(itertools.islice(server.mailbox.message_ids(), 5))
+    assert all(email['subject'] and email['from'] for email in emails)
+
+    email = call('get_email', {'email_id': emails[0]['id'], 'max_bytes': 10}).structured_content
+    assert email['id'] == emails[0]['id']
+    assert email['body_mime_type'] == 'text/plain'
+    assert email['body_truncated'] and len(email['body'].encode()) <= 10
+
+    missing = call('get_email', {'email_id': 'zz'})
+    assert missing.is_error
+
+
+def test_bulk_send_reports_malformed_messages(server):
+    sent_before = len(server.mailbox.sent)
+    result = call('send_emails_bulk', {
+        'messages': [{'to': 'ana@example.com', 'variables': {'nombre': 'Ana'}}, {'subject': 'sin destinatario'}],
+        'subject': 'Hola $nombre',
+        'body': 'Cuerpo',
+    }).structured_content
+
+    assert (result['sent'], result['failed']) == (1, 1)
+    assert [r['status'] for r in result['results']] == ['sent', 'failed']
+    assert result['results'][0]['subject'] == 'Hola Ana'
+    assert len(server.mailbox.sent) == sent_before + 1
+
+
+@pytest.mark.parametrize('query', ['is:unread', 'in:inbox -is:unread', 'is:starred'])
+def test_mirror_matches_the_api(fake, monkeypatch, tmp_path, query):
+    monkeypatch.setattr(gmail_mcp_server, 'MIRROR_PATH', '')
+    monkeypatch.setattr(gmail_mcp_server, '_mirror', None)
+    from_api = call('list_emails', {'max_results': 20, 'query': query}).structured_content['result']
+
+    monkeypatch.setattr(gmail_mcp_server, 'MIRROR_PATH', str(tmp_path / 'mirror.db'))
+    from_mirror = call('list_emails', {'max_results': 20, 'query': query}).structured_content['result']
+
+    assert gmail_mcp_server._mirror is not None and gmail_mcp_server._mirror.complete
+    assert from_mirror == from_api
@@ -0,0 +1,117 @@
+"""
+Decodificación perezosa y recorte de cuerpos MIME
+"""
+
+import base64
+
+import pytest
+
+from gmail_mime import decode_body, find_body_part, get_header, html_to_text, iter_parts, list_attachments
+
+
+def encode(data: bytes) -> str:
+    # Gmail devuelve base64url sin relleno
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def text_part(mime_type: str, data: bytes, charset: str = 'utf-8', part_id: str = '0') -> dict:
+    return {
+        'partId': part_id,
+        'mimeType': mime_type,
+        'filename': '',
+        'headers': [{'name': 'Content-Type', 'value': f'{mime_type}; charset="{charset}"'}],
+        'body': {'size': len(data), 'data': encode(data)},
+    }
+
+
+ATTACHMENT = {
+    'partId': '2',
+    'mimeType': 'text/plain',
+    'filename': 'notas.txt',
+    'body': {'size': 1234, 'attachmentId': 'att-1'},
+}
+
+MESSAGE = {
+    'mimeType': 'multipart/mixed',
+    'headers': [{'name': 'Subject', 'value': 'Hola'}],
+    'parts': [
+        {
+            'partId': '1',
+            'mimeType': 'multipart/alternative',
+            'parts': [
+                text_part('text/plain', b'texto plano', part_id='1.0'),
+                text_part('text/html', b'<p>html</p>', part_id='1.1'),
+            ],
+        },
+        ATTACHMENT,
+    ],
+}
+
+
+def test_iter_parts_keeps_message_order():
+    assert [part.get('partId') for part in iter_parts(MESSAGE)] == [None, '1', '1.0', '1.1', '2']
+
+
+def test_find_body_part():
+    assert find_body_part(MESSAGE)['partId'] == '1.0'
+    assert find_body_part(MESSAGE, 'text/html')['partId'] == '1.1'
+    # Sin la parte pedida se usa el otro tipo de texto; los adjuntos nunca cuentan como cuerpo
+    only_html = {'mimeType': 'multipart/mixed', 'parts': [ATTACHMENT, text_part('text/html', b'<b>x</b>')]}
+    assert find_body_part(only_html)['mimeType'] == 'text/html'
+    assert find_body_part({'mimeType': 'multipart/mixed', 'parts': [ATTACHMENT]}) is None
+
+
+def test_get_header_is_case_insensitive():
+    assert get_header(MESSAGE, 'subject') == 'Hola'
+    assert get_header(MESSAGE, 'From', 'Desconocido') == 'Desconocido'
+
+
+@pytest.mark.parametrize('max_bytes, expected, truncated', [
+    (1000, 'a' * 100, False),
+    (100, 'a' * 100, False),
+    (99, 'a' * 99, True),
+    (10, 'a' * 10, True),
+    (0, '', True),
+    # Un presupuesto negativo no puede saltarse el límite (slice desde el final)
+    (-10, '', True),
+])
+def test_decode_body_respects_the_budget(max_bytes, expected, truncated):
+    assert decode_body(text_part('text/plain', b'a' * 100), max_bytes) == (expected, truncated)
+
+
+def test_decode_body_drops_a_cut_multibyte_character():
+    text, truncated = decode_body(text_part('text/plain', 'ñandú'.encode()), 2)
+    assert (text, truncated) == ('ñ', True)
+    text, truncated = decode_body(text_part('text/plain', 'ñandú'.encode()), 1)
+    assert (text, truncated) == ('', True)
+
+
+def test_decode_body_uses_the_part_charset():
+    part = text_part('text/plain', 'canción'.encode('latin-1'), charset='iso-8859-1')
+    assert decode_body(part, 100) == ('canción', False)
+    unknown = text_part('text/plain', 'canción'.encode(), charset='no-existe')
+    assert decode_body(unknown, 100) == ('canción', False)
+
+
+def test_decode_body_fetches_large_bodies_stored_as_attachments():
+    fetched = []
+
+    def fetch_attachment(attachment_id):
+        fetched.append(attachment_id)
+        return encode(b'cuerpo grande')
+
+    part = {'mimeType': 'text/plain', 'body': {'size': 13, 'attachmentId': 'big'}}
+    assert decode_body(part, 6, fetch_attachment) == ('cuerpo', True)
+    assert fetched == ['big']
+    assert decode_body(part, 6) == ('', False)
+
+
+def test_html_to_text():
+    content = '<style>p {}</style><h1>T&iacute;tulo</h1><p>uno<br>dos</p><script>x()</script>'
+    assert html_to_text(content) == 'Título\nuno\ndos'
+
+
+def test_list_attachments_does_not_download_them():
+    assert list_attachments(MESSAGE) == [
+        {'filename': 'notas.txt', 'mime_type': 'text/plain', 'size': 1234, 'attachment_id': 'att-1'}
+    ]
@@ -0,0 +1,74 @@
+"""
+Sincronización del espejo local con un servicio de Gmail simulado
+"""
+
+from unittest import mock
+
+import pytest
+
+pytest.importorskip('fastmcp')
+pytest.importorskip('googleapiclient')
+
+from gmail_mirror import MailboxMirror  # noqa: E402
+
+MAILBOX = {
+    'a': ['INBOX', 'UNREAD'],
+    'b': ['TRASH'],
+    'c': ['SPAM'],
+}
+
+
+def request(result=None, error=None):
+    """Petición de googleapiclient simulada"""
+    req = mock.Mock(methodId=None)
+    if error is not None:
+        req.execute.side_effect = error
+    else:
+        req.execute.return_value = result
+    return req
+
+
+def make_service():
+    service = mock.Mock()
+    users = service.users.return_value
+    users.getProfile.return_value = request({'historyId': '10', 'emailAddress': 'me@example.com'})
+    users.labels.return_value.list.return_value = request(
+        {'labels': [{'id': label, 'name': label} for label in ('INBOX', 'SPAM', 'TRASH', 'UNREAD')]}
+    )
+
+    def list_messages(**kwargs):
+        # Sin includeSpamTrash, Gmail no devuelve spam ni papelera
+        ids = [i for i, labels in MAILBOX.items()
+               if kwargs.get('includeSpamTrash') or not {'SPAM', 'TRASH'} & set(labels)]
+        return request({'messages': [{'id': i} for i in ids]})
+
+    users.messages.return_value.list.side_effect = list_messages
+    return service
+
+
+def fetch_metadata(service, ids, headers):
+    return {i: {'id': i, 'labelIds': MAILBOX[i], 'internalDate': '1'} for i in ids}
+
+
+def test_full_sync_mirrors_spam_and_trash():
+    mirror = MailboxMirror(':memory:')
+    mirror.sync(make_service(), fetch_metadata, force=True)
+
+    assert mirror.complete
+    assert [m['id'] for m in mirror.search('', 10)] == ['a']
+    assert [m['id'] for m in mirror.search('in:trash', 10)] == ['b']
+    assert [m['id'] for m in mirror.search('in:spam', 10)] == ['c']
+    assert sorted(m['id'] for m in mirror.search('in:anywhere', 10)) == ['a', 'b', 'c']
+
+
+def test_failed_sync_waits_for_the_interval():
+    service = make_service()
+    service.users.return_value.getProfile.return_value = request(error=RuntimeError('sin red'))
+    mirror = MailboxMirror(':memory:', sync_interval=60)
+
+    with pytest.raises(RuntimeError):
+        mirror.sync(service, fetch_metadata)
+    # El siguiente intento no vuelve a descargar el buzón hasta que pase sync_interval
+    mirror.sync(service, fetch_metadata)
+    assert service.users.return_value.getProfile.return_value.execute.call_count == 1
+    assert mirror.profile() is None
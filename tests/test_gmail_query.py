@@ -0,0 +1,163 @@
+"""
+Búsquedas de Gmail compiladas a SQL sobre un espejo en memoria
+"""
+
+import sqlite3
+import time
+
+import pytest
+
+from gmail_query import UnsupportedQuery, compile_query, tokenize
+
+# Mismas columnas que las tablas de gmail_mirror.py
+SCHEMA = """
+CREATE TABLE messages (
+    id TEXT PRIMARY KEY, thread_id TEXT, internal_date INTEGER, subject TEXT, sender TEXT,
+    recipients TEXT, snippet TEXT, mime_type TEXT, size_estimate INTEGER
+);
+CREATE TABLE message_labels (message_id TEXT, label_id TEXT, PRIMARY KEY (message_id, label_id));
+"""
+
+LABELS = {'INBOX': 'INBOX', 'SPAM': 'SPAM', 'TRASH': 'TRASH', 'Label_1': 'Trabajo/Proyectos'}
+
+
+def date_ms(value: str) -> int:
+    """Medianoche local, como interpreta Gmail las fechas de after:/before:"""
+    return int(time.mktime(time.strptime(value, '%Y/%m/%d'))) * 1000
+
+
+MESSAGES = [
+    # id, remitente, destinatarios, asunto, fecha, tamaño, etiquetas
+    ('m1', 'Alice <alice@example.com>', 'me@example.com', 'Factura marzo', '2024/03/10', 1000,
+     ['INBOX', 'UNREAD']),
+    ('m2', 'Bob <bob@example.com>', 'me@example.com', 'Reunión', '2024/03/20', 5000,
+     ['INBOX', 'STARRED']),
+    ('m3', 'Spammer <win@spam.test>', 'me@example.com', 'Premio', '2024/03/21', 800, ['SPAM', 'UNREAD']),
+    ('m4', 'Alice <alice@example.com>', 'me@example.com', 'Borrado', '2024/02/01', 700, ['TRASH']),
+    ('m5', 'me@example.com', 'carol@example.com', 'Descuento 100% real', '2024/04/02', 3 * 1024 * 1024,
+     ['SENT', 'Label_1']),
+    ('m6', 'Dave <dave@example.com>', 'me@example.com', 'Descuento 1000 real', '2024/04/03', 900, ['INBOX']),
+]
+
+
+@pytest.fixture(scope='module')
+def db():
+    db = sqlite3.connect(':memory:')
+    db.executescript(SCHEMA)
+    for message_id, sender, recipients, subject, date, size, labels in MESSAGES:
+        db.execute(
+            "INSERT INTO messages VALUES (?, ?, ?, ?, ?, ?, '', 'text/plain', ?)",
+            (message_id, message_id, date_ms(date), subject, sender, recipients, size)
+        )
+        db.executemany("INSERT INTO message_labels VALUES (?, ?)", [(message_id, label) for label in labels])
+    yield db
+    db.close()
+
+
+def resolve_label(name: str):
+    wanted = name.lower().replace(' ', '-').replace('/', '-')
+    for label_id, label_name in LABELS.items():
+        if wanted in (label_id.lower(), label_name.lower().replace(' ', '-').replace('/', '-')):
+            return label_id
+    return None
+
+
+def search(db, query: str) -> list[str]:
+    where, params = compile_query(query, resolve_label)
+    rows = db.execute(f"SELECT id FROM messages m WHERE {where} ORDER BY id", params).fetchall()
+    return [row[0] for row in rows]
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('', ['m1', 'm2', 'm5', 'm6']),
+    ('from:alice', ['m1']),
+    ('FROM:ALICE@EXAMPLE.COM', ['m1']),
+    ('to:carol', ['m5']),
+    ('subject:"factura marzo"', ['m1']),
+    ('from:me', ['m5']),
+    ('is:unread', ['m1']),
+    ('is:read', ['m2', 'm5', 'm6']),
+    ('is:starred in:inbox', ['m2']),
+    ('-in:inbox', ['m5']),
+    ('label:trabajo-proyectos', ['m5']),
+    ('label:Label_1', ['m5']),
+])
+def test_operators(db, query, expected):
+    assert search(db, query) == expected
+
+
+@pytest.mark.parametrize('query, expected', [
+    # Spam y papelera quedan fuera salvo que la búsqueda los pida
+    ('in:spam', ['m3']),
+    ('in:trash', ['m4']),
+    ('label:TRASH', ['m4']),
+    ('in:anywhere', ['m1', 'm2', 'm3', 'm4', 'm5', 'm6']),
+    ('in:anywhere from:alice', ['m1', 'm4']),
+    ('is:unread in:anywhere', ['m1', 'm3']),
+])
+def test_spam_and_trash(db, query, expected):
+    assert search(db, query) == expected
+
+
+@pytest.mark.parametrize('query, expected', [
+    # Como en Gmail, OR se une más fuerte que el AND implícito
+    ('from:alice OR from:bob is:starred', ['m2']),
+    ('from:alice OR from:bob', ['m1', 'm2']),
+    ('from:alice | from:dave', ['m1', 'm6']),
+    ('-(from:alice OR from:bob)', ['m5', 'm6']),
+    ('(from:alice OR from:bob) -is:unread', ['m2']),
+    ('from:bob AND in:inbox', ['m2']),
+])
+def test_boolean_logic(db, query, expected):
+    assert search(db, query) == expected
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('after:2024/03/15', ['m2', 'm5', 'm6']),
+    ('before:2024/03/15', ['m1']),
+    ('after:2024-03-01 before:2024-04-01', ['m1', 'm2']),
+    ('larger:2M', ['m5']),
+    ('smaller:1k', ['m1', 'm6']),
+    ('larger:1000 smaller:1M', ['m2']),
+])
+def test_dates_and_sizes(db, query, expected):
+    assert search(db, query) == expected
+
+
+def test_newer_than_is_relative_to_now(db):
+    assert search(db, 'newer_than:1d') == []
+    assert search(db, 'older_than:1d') == ['m1', 'm2', 'm5', 'm6']
+
+
+def test_like_wildcards_are_escaped(db):
+    # % y _ son literales, no comodines de LIKE
+    assert search(db, 'subject:"100%"') == ['m5']
+    assert search(db, 'subject:_') == []
+
+
+@pytest.mark.parametrize('query', [
+    'factura',
+    '"texto libre"',
+    'has:attachment',
+    'label:desconocida',
+    'subject:"sin cerrar',
+    '{from:a from:b}',
+    'from:(a b)',
+    'to:me',
+    'newer_than:3w',
+    'after:mañana',
+    'larger:muy',
+    'filename:pdf',
+    '(from:alice',
+    'from:alice)',
+    'from:',
+])
+def test_unsupported_queries_fall_back(query):
+    with pytest.raises(UnsupportedQuery):
+        compile_query(query, resolve_label)
+
+
+def test_tokenize():
+    assert tokenize('-(from:a OR subject:"hola mundo")') == [
+        ('-',), ('(',), ('term', 'from', 'a'), ('OR',), ('term', 'subject', 'hola mundo'), (')',)
+    ]
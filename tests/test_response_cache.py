@@ -0,0 +1,93 @@
+"""
+Caché LRU con TTL de respuestas de herramientas y recursos
+"""
+
+import pytest
+
+import response_cache
+from response_cache import MUTATING_TOOLS, ResponseCache, make_key, ttl_for
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Reloj controlado para time.monotonic de la caché"""
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, 'monotonic', lambda: now[0])
+    return now
+
+
+@pytest.mark.parametrize('name, ttl', [
+    ('list_emails', 60),
+    ('get_email', 600),
+    ('gmail://email/abc', 600),
+    ('docs://setup-manual/latest/toc', 3600),
+    ('gmail://email', 0),
+    ('send_email', 0),
+    ('desconocida', 0),
+])
+def test_ttl_for(name, ttl):
+    assert ttl_for(name) == ttl
+
+
+def test_make_key_normalizes_arguments():
+    defaults = {'max_results': 10, 'query': ''}
+    assert make_key('list_emails', {}, defaults) == make_key('list_emails', {'max_results': 10}, defaults)
+    assert make_key('list_emails', {'query': ' is:unread ', 'max_results': 5}) == \
+        make_key('list_emails', {'max_results': 5, 'query': 'is:unread'})
+    assert make_key('list_emails', {'max_results': 5}) != make_key('list_emails', {'max_results': 6})
+
+
+def test_hit_and_miss(clock):
+    cache = ResponseCache()
+    key = make_key('get_email', {'email_id': '1'})
+    assert cache.get(key) is None
+    cache.put(key, 'respuesta', 600)
+    assert cache.get(key) == 'respuesta'
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'hit_rate': 0.5, 'entries': 1, 'invalidations': 0}
+
+
+def test_entries_expire(clock):
+    cache = ResponseCache()
+    cache.put(('list_emails', '{}'), 'lista', 60)
+    clock[0] += 59
+    assert cache.get(('list_emails', '{}')) == 'lista'
+    clock[0] += 2
+    assert cache.get(('list_emails', '{}')) is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_zero_ttl_or_size_is_not_cached(clock):
+    cache = ResponseCache()
+    cache.put(('send_email', '{}'), 'enviado', 0)
+    assert cache.get(('send_email', '{}')) is None
+    disabled = ResponseCache(max_entries=0)
+    disabled.put(('list_emails', '{}'), 'lista', 60)
+    assert disabled.get(('list_emails', '{}')) is None
+
+
+def test_least_recently_used_is_evicted(clock):
+    cache = ResponseCache(max_entries=2)
+    cache.put(('a', ''), 1, 60)
+    cache.put(('b', ''), 2, 60)
+    # Leer 'a' la convierte en la más reciente: sale 'b'
+    assert cache.get(('a', '')) == 1
+    cache.put(('c', ''), 3, 60)
+    assert cache.get(('b', '')) is None
+    assert cache.get(('a', '')) == 1
+    assert cache.get(('c', '')) == 3
+
+
+def test_mutating_tools_invalidate_dependent_entries(clock):
+    cache = ResponseCache()
+    for name in ('list_emails', 'list_emails_page', 'get_email', 'gmail://profile', 'docs://setup-manual/v1/toc'):
+        cache.put((name, '{}'), name, 600)
+
+    cache.invalidate(MUTATING_TOOLS['send_email'])
+
+    remaining = [name for name in ('list_emails', 'list_emails_page', 'get_email', 'gmail://profile',
+                                   'docs://setup-manual/v1/toc') if cache.get((name, '{}')) is not None]
+    assert remaining == ['get_email', 'docs://setup-manual/v1/toc']
+    assert cache.stats()['invalidations'] == 3
+
+    cache.invalidate()
+    assert cache.stats()['entries'] == 0
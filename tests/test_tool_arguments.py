@@ -0,0 +1,105 @@
+"""
+Decodificación y validación de los argumentos de las tool calls
+"""
+
+import pytest
+
+from tool_arguments import InvalidArguments, decode_arguments
+
+LIST_EMAILS = {
+    "type": "object",
+    "properties": {
+        "max_results": {"type": "integer", "default": 10},
+        "query": {"type": "string", "default": ""},
+    },
+}
+
+# Los parámetros de un resource template siempre son strings (ver MCPClientCore._resources_to_tools)
+MANUAL_PAGES = {
+    "type": "object",
+    "properties": {"version": {"type": "string"}, "page_range": {"type": "string"}},
+    "required": ["version", "page_range"],
+}
+
+
+@pytest.mark.parametrize("raw", [None, "", b"", {}])
+def test_empty_arguments(raw):
+    assert decode_arguments(raw) == {}
+
+
+def test_json_text_and_dict_are_equivalent():
+    assert decode_arguments('{"query": "is:unread"}') == {"query": "is:unread"}
+    assert decode_arguments(b'{"query": "is:unread"}') == {"query": "is:unread"}
+    assert decode_arguments({"query": "is:unread"}) == {"query": "is:unread"}
+
+
+@pytest.mark.parametrize("raw", [
+    "{'query': 'x'}",
+    "__import__('os').system('true')",
+    '{"query": ',
+    "[1, 2]",
+    '"texto"',
+])
+def test_invalid_json_is_rejected_not_evaluated(raw):
+    with pytest.raises(InvalidArguments):
+        decode_arguments(raw)
+
+
+@pytest.mark.parametrize("value, expected", [
+    (5, 5),
+    ("5", 5),
+    (5.0, 5),
+])
+def test_integers_are_coerced(value, expected):
+    arguments = decode_arguments({"max_results": value}, LIST_EMAILS)
+    assert arguments["max_results"] == expected
+    assert type(arguments["max_results"]) is int
+
+
+@pytest.mark.parametrize("value", [True, "cinco", 5.5, [5]])
+def test_invalid_integers_are_rejected(value):
+    with pytest.raises(InvalidArguments, match="max_results: se esperaba integer"):
+        decode_arguments({"max_results": value}, LIST_EMAILS)
+
+
+def test_number_type_accepts_numeric_text():
+    schema = {"type": "object", "properties": {"ratio": {"type": "number"}}}
+    assert decode_arguments({"ratio": "0.5"}, schema) == {"ratio": 0.5}
+    assert decode_arguments({"ratio": 2}, schema) == {"ratio": 2}
+
+
+@pytest.mark.parametrize("value, expected", [
+    (2, "2"),
+    (2.0, "2"),
+    (2.5, "2.5"),
+    ("1-3", "1-3"),
+])
+def test_numbers_are_coerced_to_strings(value, expected):
+    arguments = decode_arguments({"version": "latest", "page_range": value}, MANUAL_PAGES)
+    assert arguments == {"version": "latest", "page_range": expected}
+
+
+def test_booleans_are_not_strings():
+    with pytest.raises(InvalidArguments, match="page_range: se esperaba string"):
+        decode_arguments({"version": "latest", "page_range": True}, MANUAL_PAGES)
+
+
+def test_union_types_keep_the_first_match():
+    schema = {"type": "object", "properties": {
+        "limit": {"type": ["string", "integer"]},
+        "token": {"anyOf": [{"type": "string"}, {"type": "null"}]},
+    }}
+    assert decode_arguments({"limit": 3, "token": None}, schema) == {"limit": 3, "token": None}
+
+
+def test_errors_are_reported_together():
+    schema = {**MANUAL_PAGES, "additionalProperties": False}
+    with pytest.raises(InvalidArguments) as error:
+        decode_arguments({"version": 1.5, "pages": "2"}, schema)
+    message = str(error.value)
+    assert "faltan page_range" in message
+    assert "no existen pages" in message
+
+
+def test_unknown_properties_are_allowed_by_default():
+    assert decode_arguments({"query": "x", "extra": 1}, LIST_EMAILS) == {"query": "x", "extra": 1}
@@ -0,0 +1,137 @@
+"""
+Decodificación y validación de los argumentos de las tool calls
+
+Los argumentos que genera el modelo se decodifican como JSON (con orjson si
+está instalado) y se comprueban contra el inputSchema de la herramienta antes
+de llamar al servidor. Nunca se evalúan como código Python.
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Tipos de JSON Schema y sus equivalentes en Python
+JSON_TYPES = {
+    "string": str,
+    "integer": int,
+    "number": (int, float),
+    "boolean": bool,
+    "array": list,
+    "object": dict,
+    "null": type(None),
+}
+
+
+class InvalidArguments(ValueError):
+    """Los argumentos de una tool call no son JSON válido o no cumplen su esquema"""
+
+
+def loads(data: str | bytes):
+    """json.loads, con orjson como vía rápida si está disponible"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _schema_types(schema: dict) -> list | None:
+    """Tipos admitidos por una propiedad (None si el esquema no los restringe)"""
+    if "type" in schema:
+        return schema["type"] if isinstance(schema["type"], list) else [schema["type"]]
+    options = schema.get("anyOf") or schema.get("oneOf")
+    if options and all("type" in option for option in options):
+        return [option["type"] for option in options]
+    return None
+
+
+def _coerce(value, types: list):
+    """Convierte el valor al primer tipo admitido; los modelos pequeños suelen confundir números y texto"""
+    for expected in types:
+        python_type = JSON_TYPES.get(expected)
+        if python_type is None:
+            return value
+        # bool es subclase de int, pero en JSON no es un número
+        if isinstance(value, bool) and expected in ("integer", "number"):
+            continue
+        if isinstance(value, python_type):
+            return value
+        if expected == "integer" and isinstance(value, float) and value.is_integer():
+            return int(value)
+        if expected in ("integer", "number") and isinstance(value, str):
+            try:
+                return int(value) if expected == "integer" else float(value)
+            except ValueError:
+                continue
+    # Y al revés: números donde se espera texto (p. ej. page_range=2 en un resource template,
+    # cuyos parámetros son siempre strings)
+    if "string" in types and isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(int(value)) if isinstance(value, float) and value.is_integer() else str(value)
+    raise InvalidArguments(f"se esperaba {' o '.join(types)}")
+
+
+def validate_arguments(arguments: dict, schema: dict) -> dict:
+    """
+    Validación mínima contra el inputSchema: obligatorios, propiedades
+    desconocidas (si additionalProperties es false) y tipos de primer nivel
+
+    Returns:
+        Los argumentos con los números recibidos como texto convertidos
+
+    Raises:
+        InvalidArguments: Con todos los errores encontrados
+    """
+    properties = schema.get("properties") or {}
+    errors = []
+
+    missing = [name for name in schema.get("required", []) if name not in arguments]
+    if missing:
+        errors.append(f"faltan {', '.join(missing)}")
+
+    if schema.get("additionalProperties") is False:
+        unknown = [name for name in arguments if name not in properties]
+        if unknown:
+            errors.append(f"no existen {', '.join(unknown)}")
+
+    validated = dict(arguments)
+    for name, value in arguments.items():
+        types = _schema_types(properties.get(name, {}))
+        if types is None:
+            continue
+        try:
+            validated[name] = _coerce(value, types)
+        except InvalidArguments as e:
+            errors.append(f"{name}: {e}")
+
+    if errors:
+        raise InvalidArguments("; ".join(errors))
+    return validated
+
+
+def decode_arguments(raw, schema: dict | None = None) -> dict:
+    """
+    Decodifica los argumentos de una tool call y los valida contra su esquema
+
+    Args:
+        raw: Texto JSON (OpenAI) o diccionario ya decodificado (Ollama)
+        schema: inputSchema de la herramienta
+
+    Raises:
+        InvalidArguments: Si no son un objeto JSON válido o no cumplen el esquema
+    """
+    if raw is None or raw == "" or raw == b"":
+        arguments = {}
+    elif isinstance(raw, (str, bytes)):
+        try:
+            arguments = loads(raw)
+        except ValueError as e:
+            raise InvalidArguments(f"JSON no válido: {e}")
+    else:
+        arguments = dict(raw)
+
+    if not isinstance(arguments, dict):
+        raise InvalidArguments("los argumentos deben ser un objeto JSON")
+    if schema:
+        arguments = validate_arguments(arguments, schema)
+    return arguments
@@ -0,0 +1,120 @@
+"""
+Traza de un turno de chat del cliente MCP
+
+Registra cuánto tarda cada parte de un turno: conexión con el servidor MCP
+(arranque del subproceso), listado del catálogo, cada llamada al LLM (tokens
+y tiempo hasta el primer token) y cada herramienta o recurso. Así se puede
+ver si un turno lento fue el modelo, Gmail o el arranque del servidor.
+"""
+
+import contextlib
+import contextvars
+import time
+
+# Traza del turno en curso; la leen las partes del cliente que no la reciben como argumento
+current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+# Tipos de span que se suman en el resumen ("tools" es el tiempo real de cada ronda paralela)
+SUMMARY_KINDS = ("connect", "catalog", "llm", "tools")
+
+
+class TurnTrace:
+    """Spans de un turno: {kind, name, start_ms, duration_ms, ...atributos}"""
+
+    def __init__(self, model: str = ""):
+        self.model = model
+        self.started = time.time()
+        self.spans = []
+        self.total_ms = None
+        self._start = time.perf_counter()
+
+    def elapsed_ms(self) -> float:
+        """Milisegundos desde el inicio del turno"""
+        return (time.perf_counter() - self._start) * 1000
+
+    @contextlib.contextmanager
+    def span(self, kind: str, name: str, **attributes):
+        """
+        Mide el bloque y lo añade a la traza
+
+        Devuelve el diccionario del span para que el bloque añada atributos
+        (tokens, cached, error...).
+        """
+        span = {"kind": kind, "name": name, "start_ms": round(self.elapsed_ms(), 1), **attributes}
+        self.spans.append(span)
+        start = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span.setdefault("error", type(e).__name__)
+            raise
+        finally:
+            span["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+    def finish(self):
+        """Cierra el turno"""
+        self.total_ms = round(self.elapsed_ms(), 1)
+
+    def summary(self) -> dict:
+        """Milisegundos por tipo de span y el resto sin atribuir ("other")"""
+        totals = {kind: 0.0 for kind in SUMMARY_KINDS}
+        for span in self.spans:
+            # Las conexiones dentro del catálogo ya cuentan en su span padre
+            if span["kind"] in totals and not span.get("nested"):
+                totals[span["kind"]] += span.get("duration_ms", 0)
+
+        totals = {kind: round(ms, 1) for kind, ms in totals.items()}
+        total = self.total_ms if self.total_ms is not None else round(self.elapsed_ms(), 1)
+        totals["other"] = round(max(total - sum(totals.values()), 0), 1)
+        totals["total"] = total
+        return totals
+
+    def to_dict(self) -> dict:
+        llm_spans = [span for span in self.spans if span["kind"] == "llm"]
+        return {
+            "model": self.model,
+            "started": self.started,
+            "summary": self.summary(),
+            "llm_calls": len(llm_spans),
+            "prompt_tokens": sum(span.get("prompt_tokens") or 0 for span in llm_spans),
+            "completion_tokens": sum(span.get("completion_tokens") or 0 for span in llm_spans),
+            "spans": self.spans,
+        }
+
+
+@contextlib.contextmanager
+def use_trace(trace: TurnTrace | None):
+    """Fija la traza del turno en curso dentro del bloque"""
+    token = current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        current_trace.reset(token)
+
+
+@contextlib.contextmanager
+def trace_span(kind: str, name: str, **attributes):
+    """Span en la traza en curso; fuera de un turno no registra nada"""
+    trace = current_trace.get()
+    if trace is None:
+        yield {}
+        return
+
+    # Un span abierto dentro de otro no se suma dos veces en el resumen
+    if _current_span.get() is not None:
+        attributes["nested"] = True
+
+    with trace.span(kind, name, **attributes) as span:
+        token = _current_span.set(span)
+        try:
+            yield span
+        finally:
+            _current_span.reset(token)
+
+
+def annotate(**attributes):
+    """Añade atributos al span en curso (p. ej. cached=True)"""
+    span = _current_span.get()
+    if span is not None:
+        span.update(attributes)